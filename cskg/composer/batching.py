@@ -0,0 +1,86 @@
+from typing import Iterable
+import bson
+from neo4j.exceptions import Neo4jError
+
+# Neo4j error codes raised when a transaction is too large for the server
+BATCH_TOO_LARGE_CODES = ("OutOfMemory", "MemoryLimit", "TimedOut")
+
+
+class BatchTooLarge(Exception):
+    """Raised when the server rejects a batch for its memory use or duration."""
+
+
+class AdaptiveBatcher:
+    """
+    Splits a stream of components into batches, capped by row count and by
+    payload bytes. The row count follows the latency of the writes: it grows
+    while batches commit under the target latency, shrinks in proportion when
+    they take longer, and halves whenever a batch is too large for the server.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_size: int = 10000,
+        min_size: int = 100,
+        max_size: int = 100000,
+        target_bytes: int = 16 * 2**20,
+        target_latency: float = 2.0,
+    ):
+        self.name = name
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_bytes = target_bytes
+        self.target_latency = target_latency
+        self.back_off_count = 0
+
+    def batches(self, components: Iterable[dict]):
+        batch, batch_bytes = [], 0
+        for component in components:
+            component_bytes = len(bson.encode(component))
+            if batch and (
+                len(batch) >= self.size
+                or batch_bytes + component_bytes > self.target_bytes
+            ):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(component)
+            batch_bytes += component_bytes
+
+        if batch:
+            yield batch
+
+    def record(self, batch_size: int, latency: float):
+        """Shrink to the size that meets the target latency, or grow past it."""
+        if latency > self.target_latency:
+            self.size = self.clamp(batch_size * self.target_latency / latency)
+        elif latency < self.target_latency / 2 and batch_size >= self.size:
+            self.size = self.clamp(self.size * 1.5)
+
+    def back_off(self, batch_size: int):
+        self.size = self.clamp(batch_size / 2)
+        self.target_bytes = max(self.target_bytes // 2, 2**20)
+        self.back_off_count += 1
+
+    def clamp(self, size: float) -> int:
+        return max(self.min_size, min(self.max_size, int(size)))
+
+
+def is_batch_too_large(error: Neo4jError) -> bool:
+    return any(code in (error.code or "") for code in BATCH_TOO_LARGE_CODES)
+
+
+def get_batch_rows(params: dict) -> tuple[str, list]:
+    """The rows of a batch query are its one list parameter."""
+    ((key, rows),) = (
+        (key, value) for key, value in params.items() if isinstance(value, list)
+    )
+    return key, rows
+
+
+def split_params(params: dict) -> tuple[dict, dict]:
+    """Split the rows of a batch query in halves, keeping its other parameters."""
+    key, rows = get_batch_rows(params)
+    middle = len(rows) // 2
+    return {**params, key: rows[:middle]}, {**params, key: rows[middle:]}
@@ -0,0 +1,261 @@
+import csv
+import gzip
+import os
+from collections import Counter, defaultdict
+from typing import Iterable, TextIO
+from loguru import logger
+from pymongo.collection import Collection
+from pymongo.database import Database as MongoDatabase
+from tqdm import tqdm
+
+from cskg.utils.entity import Entity
+from cskg.utils.relationship import Relationship
+from cskg.composer.graph_schema import GraphSchema
+
+# Mongo field types, as reported by `$type`, to neo4j-admin header types
+HEADER_TYPES = {
+    "string": "string",
+    "bool": "boolean",
+    "int": "long",
+    "long": "long",
+    "double": "double",
+    "array": "string[]",
+}
+ARRAY_DELIMITER = ";"
+
+
+class BulkImportExporter:
+    """
+    Streams the staged components into the CSV layout expected by
+    `neo4j-admin database import full`, for building a graph from scratch
+    offline. Every entity and relationship type gets its own header and
+    data file, nodes are identified by their qualified name ID within the
+    ID space of their label family, and relationships with a missing
+    endpoint are dropped. The import leaves the graph without constraints
+    and indexes, their queries are written to a script to run afterwards.
+    """
+
+    def __init__(
+        self,
+        mongo_db: MongoDatabase,
+        import_path: str,
+        compress: bool = True,
+        batch_size: int = 10000,
+    ):
+        self.mongo_db = mongo_db
+        self.import_path = import_path
+        self.compress = compress
+        self.batch_size = batch_size
+        self.node_ids: dict[str, set[int]] = defaultdict(set)
+        self.node_files: list[tuple[str, str]] = []
+        self.relationship_files: list[tuple[str, str]] = []
+        self.exported_counts = Counter()
+        self.duplicate_count = 0
+        self.dropped_count = 0
+
+    def export(self):
+        os.makedirs(os.path.join(self.import_path, "nodes"), exist_ok=True)
+        os.makedirs(os.path.join(self.import_path, "relationships"), exist_ok=True)
+
+        # Nodes are exported first, so relationships can be checked against them
+        for entity_class in Entity.visit_subclasses():
+            self.export_entities(entity_class)
+
+        for relationship_class in Relationship.visit_subclasses():
+            self.export_relationships(relationship_class)
+
+        self.export_schema()
+        self.report()
+
+    def export_entities(self, entity_class: type[Entity]):
+        collection = self.mongo_db.get_collection(entity_class.type)
+        field_types = get_field_types(
+            collection, ["_id", "qname_id", "label", "extra_labels"]
+        )
+        if not field_types:
+            return
+
+        id_space = get_id_space(entity_class)
+        labels = ARRAY_DELIMITER.join(entity_class.get_labels())
+        header = [f"qname_id:ID({id_space})", ":LABEL"]
+        header += [get_header_column(field, type) for field, type in field_types]
+
+        node_ids = self.node_ids[id_space]
+        file_name = entity_class.type
+        with self.open_files("nodes", file_name, header) as data_file:
+            writer = csv.writer(data_file)
+            entities = collection.find({}, {"_id": False}, batch_size=self.batch_size)
+            for entity in tqdm(entities, desc=f"Exporting {file_name}", unit="nodes"):
+                # Shared entities may be staged by more than one type
+                if entity["qname_id"] in node_ids:
+                    self.duplicate_count += 1
+                    continue
+                node_ids.add(entity["qname_id"])
+
+                row = [entity["qname_id"], labels]
+                row += [format_value(entity.get(field)) for field, type in field_types]
+                writer.writerow(row)
+                self.exported_counts[file_name] += 1
+
+    def export_relationships(self, relationship_class: type[Relationship]):
+        collection = self.mongo_db.get_collection(relationship_class.type)
+        field_types = get_field_types(collection, ["_id"])
+        if not field_types:
+            return
+
+        # Relationships are split by the ID spaces of their endpoints
+        pipeline = [
+            {"$group": {"_id": {"from_type": "$from_type", "to_type": "$to_type"}}}
+        ]
+        for group in collection.aggregate(pipeline):
+            from_type, to_type = group["_id"]["from_type"], group["_id"]["to_type"]
+            from_space = get_id_space(Entity.get_class(from_type))
+            to_space = get_id_space(Entity.get_class(to_type))
+            from_node_ids, to_node_ids = (
+                self.node_ids[from_space],
+                self.node_ids[to_space],
+            )
+
+            header = [f":START_ID({from_space})", f":END_ID({to_space})", ":TYPE"]
+            header += [get_header_column(field, type) for field, type in field_types]
+
+            file_name = f"{relationship_class.type}.{from_type}.{to_type}"
+            with self.open_files("relationships", file_name, header) as data_file:
+                writer = csv.writer(data_file)
+                relationships = collection.find(
+                    {"from_type": from_type, "to_type": to_type},
+                    {"_id": False},
+                    batch_size=self.batch_size,
+                )
+                for relationship in tqdm(
+                    relationships, desc=f"Exporting {file_name}", unit="relationships"
+                ):
+                    from_id = relationship["from_qname_id"]
+                    to_id = relationship["to_qname_id"]
+                    if from_id not in from_node_ids or to_id not in to_node_ids:
+                        self.dropped_count += 1
+                        continue
+
+                    row = [from_id, to_id, relationship_class.label]
+                    row += [
+                        format_value(relationship.get(field))
+                        for field, type in field_types
+                    ]
+                    writer.writerow(row)
+                    self.exported_counts[file_name] += 1
+
+    def export_schema(self):
+        graph_schema = GraphSchema(neo_db=None)
+        with open(self.get_schema_path(), "w") as schema_file:
+            for name, query in graph_schema.plan():
+                schema_file.write(" ".join(query.split()) + ";\n")
+
+    def get_schema_path(self) -> str:
+        return os.path.join(self.import_path, "schema.cypher")
+
+    def open_files(self, folder: str, file_name: str, header: list[str]) -> TextIO:
+        """Write the header file and open the data file next to it."""
+        header_path = os.path.join(self.import_path, folder, f"{file_name}.header.csv")
+        with open(header_path, "w", newline="") as header_file:
+            csv.writer(header_file).writerow(header)
+
+        data_path = os.path.join(self.import_path, folder, f"{file_name}.csv")
+        if self.compress:
+            data_path += ".gz"
+            data_file = gzip.open(data_path, "wt", newline="", compresslevel=1)
+        else:
+            data_file = open(data_path, "w", newline="")
+
+        files = self.node_files if folder == "nodes" else self.relationship_files
+        files.append((header_path, data_path))
+        return data_file
+
+    def get_import_command(self, database: str = "neo4j") -> str:
+        arguments = [
+            f"neo4j-admin database import full {database}",
+            "--overwrite-destination",
+            "--id-type=integer",
+            "--multiline-fields=true",
+            f"--array-delimiter='{ARRAY_DELIMITER}'",
+        ]
+        for header_path, data_path in self.node_files:
+            arguments.append(f"--nodes={header_path},{data_path}")
+        for header_path, data_path in self.relationship_files:
+            arguments.append(f"--relationships={header_path},{data_path}")
+        return " \\\n    ".join(arguments)
+
+    def get_schema_command(self, database: str = "neo4j") -> str:
+        return f"cypher-shell -d {database} -f {self.get_schema_path()}"
+
+    def report(self):
+        for file_name, count in sorted(self.exported_counts.items()):
+            logger.info(f"{file_name}: {count} exported")
+        logger.info(
+            f"Total: {self.exported_counts.total()} exported, "
+            f"{self.duplicate_count} duplicate nodes skipped, "
+            f"{self.dropped_count} relationships with missing endpoints dropped"
+        )
+        logger.info(f"Import with:\n{self.get_import_command()}")
+        logger.info(
+            "Once neo4j is started on the imported database, create the "
+            f"constraints and indexes with:\n{self.get_schema_command()}"
+        )
+
+
+def get_id_space(entity_class: type[Entity]) -> str:
+    """
+    Nodes are identified within their label family. Methods are referenced
+    as functions as well, so they share the `Function` ID space.
+    """
+    entity_labels = {
+        subclass.label for subclass in Entity.visit_subclasses() if subclass.label
+    }
+    for label in entity_class.extra_labels:
+        if label in entity_labels:
+            return label
+    return entity_class.label
+
+
+def get_field_types(
+    collection: Collection, excluded_fields: Iterable[str]
+) -> list[tuple[str, str]]:
+    """Field names and header types over all documents of the collection."""
+    pipeline = [
+        {"$project": {"_id": False, "fields": {"$objectToArray": "$$ROOT"}}},
+        {"$unwind": "$fields"},
+        {"$match": {"fields.k": {"$nin": list(excluded_fields)}}},
+        {
+            "$group": {
+                "_id": "$fields.k",
+                "types": {"$addToSet": {"$type": "$fields.v"}},
+            }
+        },
+        {"$sort": {"_id": 1}},
+    ]
+
+    field_types = []
+    for field in collection.aggregate(pipeline):
+        types = {
+            HEADER_TYPES.get(type, "string")
+            for type in field["types"]
+            if type != "null"
+        }
+        field_type = types.pop() if len(types) == 1 else "string"
+        field_types.append((field["_id"], field_type))
+    return field_types
+
+
+def get_header_column(field: str, field_type: str) -> str:
+    if field_type == "string":
+        return field
+    return f"{field}:{field_type}"
+
+
+def format_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return ARRAY_DELIMITER.join(map(str, value))
+    return value
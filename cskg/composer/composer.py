@@ -1,42 +1,99 @@
-from typing import Iterable
+import json
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from enum import StrEnum
+from functools import partial
+from time import perf_counter
+from typing import Callable, Iterable
+from uuid import uuid4
 from pymongo.database import Database as MongoDatabase
 from loguru import logger
-from neo4j.exceptions import ClientError
+from neo4j import ManagedTransaction
+from neo4j.exceptions import Neo4jError
 from neomodel import clear_neo4j_database
 from neomodel.util import Database as NeoDatabase
 from tqdm import tqdm
 
 from cskg.utils.entity import Entity
 from cskg.utils.relationship import Relationship
+from cskg.utils.mixins import ExternalComponentMixin
+from cskg.utils.file_hashes import FileHashStore
+from cskg.utils.symbols import get_qname_id
+from cskg.composer.bulk_import import BulkImportExporter
+from cskg.composer.prefetch import Prefetcher
+from cskg.composer.graph_schema import GraphSchema
+from cskg.composer.batching import (
+    AdaptiveBatcher,
+    BatchTooLarge,
+    is_batch_too_large,
+    get_batch_rows,
+    split_params,
+)
+
+
+class ComposeMode(StrEnum):
+    REBUILD = "rebuild"
+    INCREMENTAL = "incremental"
+    BULK_IMPORT = "bulk_import"
+    UPSERT = "upsert"
 
 
 class GraphComposer:
 
-    def __init__(self, mongo_db: MongoDatabase, neo_db: NeoDatabase):
+    def __init__(
+        self,
+        mongo_db: MongoDatabase,
+        neo_db: NeoDatabase,
+        mode: ComposeMode = ComposeMode.REBUILD,
+        import_path: str = "import",
+        workers: int = 1,
+        prefetch_size: int = 2,
+        batch_target_bytes: int = 16 * 2**20,
+        batch_target_latency: float = 2.0,
+    ):
         self.mongo_db = mongo_db
         self.neo_db = neo_db
+        self.mode = mode
+        self.import_path = import_path
+        self.workers = workers
+        self.prefetch_size = prefetch_size
+        self.batch_target_bytes = batch_target_bytes
+        self.batch_target_latency = batch_target_latency
+        self.batchers: dict[str, AdaptiveBatcher] = {}
+        self.file_hashes = FileHashStore(self.mongo_db)
 
-        # Drop everything in neo4j
-        clear_neo4j_database(self.neo_db, clear_constraints=True, clear_indexes=True)
+        # Upserted components are stamped with the run that composed them
+        self.run_id = uuid4().hex
 
-        self.create_indexes()
-        self.count_total_components()
+        # Node IDs of composed entities per label, keyed by qualified name ID
+        self.node_ids: dict[str, dict[int, int]] = defaultdict(dict)
+        self.dropped_count = 0
 
-    def create_indexes(self):
-        # Create indexes for entities
-        for entity_class in Entity.visit_subclasses():
-            entity_type = entity_class.type
-            entity_label = entity_class.label
-            index_cypher = f"""
-                CREATE INDEX {entity_type}_qualified_name FOR (n:{entity_label}) ON (n.qualified_name)
-            """
-            logger.debug(index_cypher)
+        # Shared across the sessions of parallel composition
+        self.sessions = threading.local()
+        self.lock = threading.Lock()
+        self.timings = Counter()
 
-            try:
-                self.neo_db.cypher_query(index_cypher)
-            except ClientError as e:
-                logger.error(e)
-                ...
+        self.graph_schema = GraphSchema(self.neo_db)
+
+        # Bulk import files are built offline, without touching neo4j
+        if self.mode == ComposeMode.BULK_IMPORT:
+            return
+
+        # The neomodel connection is thread local, other threads share its driver
+        self.open_session = partial(
+            self.neo_db.driver.session, database=self.neo_db._database_name
+        )
+
+        # Drop everything in neo4j
+        if self.mode == ComposeMode.REBUILD:
+            clear_neo4j_database(
+                self.neo_db, clear_constraints=True, clear_indexes=True
+            )
+
+        self.graph_schema.create()
+        self.count_total_components()
 
     def count_total_components(self):
         total_components = 0
@@ -52,48 +109,455 @@ class GraphComposer:
         return total_components
 
     def compose(self):
+        changed_files, deleted_files = self.file_hashes.get_pending()
+        pending_files = changed_files + deleted_files
+
+        # Export everything for neo4j-admin instead
+        if self.mode == ComposeMode.BULK_IMPORT:
+            exporter = BulkImportExporter(self.mongo_db, self.import_path)
+            exporter.export()
+            self.file_hashes.acknowledge(pending_files)
+            return
+
         # Compose graph
-        total_components = self.count_total_components()
+        if self.mode == ComposeMode.INCREMENTAL:
+            retracted_qname_ids = self.retract_files(pending_files)
+            entity_filter, external_filter, relationship_filters = (
+                self.get_change_filters(
+                    changed_files, pending_files, retracted_qname_ids
+                )
+            )
+            total_components = None
+        else:
+            entity_filter, external_filter, relationship_filters = None, None, [None]
+            total_components = self.count_total_components()
+
         bar = tqdm(total=total_components, desc="Composing graph", unit="components")
+        if self.workers > 1:
+            self.compose_parallel(
+                entity_filter, external_filter, relationship_filters, bar
+            )
+        else:
+            # Relationship rows are built from the node IDs of the created
+            # entities, so relationships are only read once entities are written
+            visit_entities = partial(
+                self.visit_entities, entity_filter, external_filter=external_filter
+            )
+            self.compose_serial([visit_entities], bar)
+            self.graph_schema.await_online()
+            relationship_stages = [
+                partial(self.visit_relationships, relationship_filter)
+                for relationship_filter in relationship_filters
+            ]
+            self.compose_serial(relationship_stages, bar)
+        bar.close()
+        self.report_timings()
+
+        # The graph stays queryable until the components left over are swept
+        if self.mode == ComposeMode.UPSERT:
+            self.sweep_stale_components()
+
+        if self.dropped_count:
+            logger.warning(
+                f"Dropped {self.dropped_count} relationships with missing endpoints"
+            )
+        self.file_hashes.acknowledge(pending_files)
+
+    def compose_serial(self, stages: list[Callable[[], Iterable]], bar: tqdm):
         with self.neo_db.transaction:
-            for cypher, params, bulk_size in self.visit():
-                self.neo_db.cypher_query(cypher, params)
-                self.neo_db.commit()
-                bar.update(bulk_size)
-                bar.write(f"Batch committed ({bar.n}/{bar.total})")
+            for visit_components in stages:
+                components = self.prefetch(visit_components)
+                for component in components:
+                    cypher, params, bulk_size, handle_results, batcher = component
+                    start_time = perf_counter()
+                    results = self.write_batch(
+                        self.write_serial, cypher, params, batcher
+                    )
+                    if handle_results:
+                        handle_results(results)
+                    self.timings["write"] += perf_counter() - start_time
+                    bar.update(bulk_size)
+                    bar.write(f"Batch committed ({bar.n}/{bar.total})")
 
-                self.neo_db.begin()
-        bar.close()
+    def compose_parallel(
+        self,
+        entity_filter: dict,
+        external_filter: dict,
+        relationship_filters: list[dict],
+        bar: tqdm,
+    ):
+        """
+        Compose on a pool of workers, each with its own session. Entities of
+        different types are created concurrently, and every relationship is
+        created once all entities exist. Relationships are bucketed by the
+        qualified name IDs of both endpoints, and the tasks of each round
+        cover disjoint buckets, so no two workers write relationships on the
+        same node. Deadlocks that still happen are transient errors, which
+        managed transactions retry.
+        """
+        # Bucket filters are evaluated on index keys rather than documents
+        for relationship_class in Relationship.visit_subclasses():
+            collection = self.mongo_db.get_collection(relationship_class.type)
+            collection.create_index([("from_qname_id", 1), ("to_qname_id", 1)])
 
-    def visit(self):
-        yield from self.visit_entities()
-        yield from self.visit_relationships()
+        with ThreadPoolExecutor(self.workers) as executor:
+            tasks = [
+                partial(
+                    self.visit_entities,
+                    entity_filter,
+                    [entity_class],
+                    external_filter=external_filter,
+                )
+                for entity_class in Entity.visit_subclasses()
+            ]
+            self.run_tasks(executor, tasks, bar)
+            self.graph_schema.await_online()
 
-    def visit_entities(self):
-        for entity_class in Entity.visit_subclasses():
+            bucket_count = 2 * self.workers
+            for relationship_filter in relationship_filters:
+                for bucket_round in get_bucket_schedule(self.workers):
+                    tasks = [
+                        partial(
+                            self.visit_relationship_buckets,
+                            relationship_filter,
+                            bucket_count,
+                            bucket_pairs,
+                        )
+                        for bucket_pairs in bucket_round
+                    ]
+                    self.run_tasks(executor, tasks, bar)
+
+    def visit_relationship_buckets(
+        self,
+        relationship_filter: dict,
+        bucket_count: int,
+        bucket_pairs: list[tuple[int, int]],
+    ):
+        for from_bucket, to_bucket in bucket_pairs:
+            bucket_filter = {
+                **(relationship_filter or {}),
+                **get_bucket_filter(bucket_count, from_bucket, to_bucket),
+            }
+            yield from self.visit_relationships(bucket_filter)
+
+    def run_tasks(self, executor: ThreadPoolExecutor, tasks: list, bar: tqdm):
+        futures = [executor.submit(self.run_session, task, bar) for task in tasks]
+        for future in futures:
+            future.result()
+
+    def run_session(self, visit_components: Callable[[], Iterable], bar: tqdm):
+        with self.open_session() as session:
+            components = self.prefetch(visit_components)
+            write = partial(session.execute_write, run_query)
+            for component in components:
+                cypher, params, bulk_size, handle_results, batcher = component
+                start_time = perf_counter()
+                results = self.write_batch(write, cypher, params, batcher)
+                if handle_results:
+                    handle_results(results)
+                with self.lock:
+                    self.timings["write"] += perf_counter() - start_time
+                    bar.update(bulk_size)
+                    bar.write(f"Batch committed ({bar.n}/{bar.total})")
+
+    def write_serial(self, cypher: str, params: dict) -> list:
+        """Write a batch in the current transaction, and start the next one."""
+        try:
+            results, meta = self.neo_db.cypher_query(cypher, params)
+            self.neo_db.commit()
+        except Neo4jError as e:
+            if self.neo_db._active_transaction is not None:
+                self.neo_db.rollback()
+            if is_batch_too_large(e):
+                raise BatchTooLarge(e.code) from e
+            raise
+        finally:
+            self.neo_db.begin()
+        return results
+
+    def write_batch(
+        self,
+        write: Callable[[str, dict], list],
+        cypher: str,
+        params: dict,
+        batcher: AdaptiveBatcher,
+    ) -> list:
+        """
+        Write a batch and record its latency. Batches the server rejects as
+        too large are split in halves and retried, and the batcher backs off.
+        """
+        _, rows = get_batch_rows(params)
+        start_time = perf_counter()
+        try:
+            results = write(cypher, params)
+        except BatchTooLarge as e:
+            if len(rows) <= 1:
+                raise
+            logger.warning(
+                f"Splitting batch of {len(rows)} {batcher.name} components ({e})"
+            )
+            batcher.back_off(len(rows))
+            first_params, second_params = split_params(params)
+            return self.write_batch(
+                write, cypher, first_params, batcher
+            ) + self.write_batch(write, cypher, second_params, batcher)
+
+        batcher.record(len(rows), perf_counter() - start_time)
+        return results
+
+    def get_batcher(self, name: str) -> AdaptiveBatcher:
+        """Batchers are kept per component stream, across workers and stages."""
+        with self.lock:
+            if name not in self.batchers:
+                self.batchers[name] = AdaptiveBatcher(
+                    name,
+                    target_bytes=self.batch_target_bytes,
+                    target_latency=self.batch_target_latency,
+                )
+            return self.batchers[name]
+
+    def prefetch(self, visit_components: Callable[[], Iterable]):
+        """
+        Read and prepare the next batches on a background thread, while the
+        current batch is written. Node ID lookups made while reading go
+        through the reader's own session.
+        """
+        prefetcher = Prefetcher(
+            partial(self.visit_in_session, visit_components), self.prefetch_size
+        )
+        try:
+            yield from prefetcher
+        finally:
+            with self.lock:
+                self.timings["read"] += prefetcher.read_time
+                self.timings["read_blocked"] += prefetcher.read_blocked_time
+                self.timings["write_blocked"] += prefetcher.write_blocked_time
+
+    def visit_in_session(self, visit_components: Callable[[], Iterable]):
+        with self.open_session() as session:
+            self.sessions.session = session
+            try:
+                yield from visit_components()
+            finally:
+                self.sessions.session = None
+
+    def report_timings(self):
+        # Summed over sessions when composing in parallel
+        logger.info(
+            f"Reading from mongo: {self.timings['read']:.2f}s, "
+            f"blocked on neo4j writes for {self.timings['read_blocked']:.2f}s"
+        )
+        logger.info(
+            f"Writing to neo4j: {self.timings['write']:.2f}s, "
+            f"blocked on mongo reads for {self.timings['write_blocked']:.2f}s"
+        )
+        if self.timings["read_blocked"] > self.timings["write_blocked"]:
+            logger.info("Bottleneck: neo4j writes")
+        else:
+            logger.info("Bottleneck: mongo reads")
+
+        for batcher in self.batchers.values():
+            logger.debug(
+                f"{batcher.name}: batch size {batcher.size}, "
+                f"backed off {batcher.back_off_count} times"
+            )
+
+    def cypher_query(self, query: str, params: dict = None) -> list:
+        """Run a query on the session of the current worker, if there is one."""
+        session = getattr(self.sessions, "session", None)
+        if session is None:
+            results, meta = self.neo_db.cypher_query(query, params)
+            return results
+        return session.execute_read(run_query, query, params)
+
+    def sweep_stale_components(self):
+        """Delete the components not stamped by this run, in batches."""
+        relationship_labels = {
+            relationship_class.label
+            for relationship_class in Relationship.visit_subclasses()
+        }
+        for relationship_label in relationship_labels:
+            query = f"""
+                MATCH ()-[r:{relationship_label}]->()
+                WHERE r.compose_run IS NULL OR r.compose_run <> $run_id
+                CALL {{ WITH r DELETE r }}
+                IN TRANSACTIONS OF 10000 ROWS
+            """
+            logger.debug(query)
+            self.neo_db.cypher_query(query, {"run_id": self.run_id})
+
+        entity_labels = {
+            entity_class.label for entity_class in Entity.visit_subclasses()
+        }
+        for entity_label in entity_labels:
+            query = f"""
+                MATCH (n:{entity_label})
+                WHERE n.compose_run IS NULL OR n.compose_run <> $run_id
+                CALL {{ WITH n DETACH DELETE n }}
+                IN TRANSACTIONS OF 10000 ROWS
+            """
+            logger.debug(query)
+            self.neo_db.cypher_query(query, {"run_id": self.run_id})
+
+        logger.info(f"Swept components left over from before run {self.run_id}")
+
+    def get_change_filters(
+        self,
+        changed_files: list[str],
+        retracted_files: list[str],
+        retracted_qname_ids: list[int],
+    ) -> tuple[dict, dict, list[dict]]:
+        # Components staged from changed files
+        changed_filter = {"file_path": {"$in": changed_files}}
+
+        # External entities the changed files reference, the others are in
+        # the graph already or not referenced at all
+        referenced_qname_ids = set()
+        for relationship_class in Relationship.visit_subclasses():
+            collection = self.mongo_db.get_collection(relationship_class.type)
+            for field in ("from_qname_id", "to_qname_id"):
+                referenced_qname_ids.update(collection.distinct(field, changed_filter))
+        external_filter = {"qname_id": {"$in": list(referenced_qname_ids)}}
+
+        # Relationships from untouched files that were detached by the retraction
+        detached_filter = {
+            "file_path": {"$nin": retracted_files},
+            "$or": [
+                {"from_qname_id": {"$in": retracted_qname_ids}},
+                {"to_qname_id": {"$in": retracted_qname_ids}},
+            ],
+        }
+        return changed_filter, external_filter, [changed_filter, detached_filter]
+
+    def retract_files(self, file_paths: list[str]) -> list[int]:
+        """
+        Delete the nodes and relationships staged from the given files, and
+        return the qualified name IDs of the deleted nodes.
+        """
+        if not file_paths:
+            return []
+
+        for relationship_class in Relationship.visit_subclasses():
+            query = f"""
+                MATCH ()-[r:{relationship_class.label}]->()
+                WHERE r.file_path IN $file_paths
+                DELETE r
+            """
+            logger.debug(query)
+            self.neo_db.cypher_query(query, {"file_paths": file_paths})
+
+        retracted_qname_ids = []
+        entity_labels = {
+            entity_class.label for entity_class in Entity.visit_subclasses()
+        }
+        for entity_label in entity_labels:
+            query = f"""
+                MATCH (n:{entity_label})
+                WHERE n.file_path IN $file_paths
+                WITH n, n.qname_id AS qname_id
+                DETACH DELETE n
+                RETURN qname_id
+            """
+            logger.debug(query)
+            results, meta = self.neo_db.cypher_query(query, {"file_paths": file_paths})
+            retracted_qname_ids.extend(qname_id for (qname_id,) in results)
+
+        logger.info(
+            f"Retracted {len(retracted_qname_ids)} entities "
+            f"from {len(file_paths)} files"
+        )
+        return retracted_qname_ids
+
+    def visit_entities(
+        self,
+        entity_filter: dict = None,
+        entity_classes: Iterable[type[Entity]] = None,
+        external_filter: dict = None,
+    ):
+        for entity_class in entity_classes or Entity.visit_subclasses():
             # Get entity collection
             entity_labels = "".join(
                 map(lambda label: f":{label}", entity_class.get_labels())
             )
 
             collection = self.mongo_db.get_collection(entity_class.type)
-            entity_collection = collection.find(
-                {},
-                {"_id": False, "label": False, "extra_labels": False},
+            projection = {"_id": False, "label": False, "extra_labels": False}
+
+            if self.mode == ComposeMode.UPSERT:
+                # Entities are matched on identity and stamped with the run
+                entity_collection = collection.find({}, projection)
+                query = f"""
+                    UNWIND $entities AS entity
+                    MERGE (n{entity_labels} {{
+                        qname_id: entity.qname_id, type: entity.type
+                    }})
+                    SET n = entity, n.compose_run = $run_id
+                    RETURN entity.qname_id, id(n)
+                """
+            elif self.mode == ComposeMode.INCREMENTAL and issubclass(
+                entity_class, ExternalComponentMixin
+            ):
+                # External entities are shared across files, add the missing ones
+                entity_collection = collection.find(external_filter or {}, projection)
+                query = f"""
+                    UNWIND $entities AS entity
+                    MERGE (n{entity_labels} {{qname_id: entity.qname_id}})
+                    ON CREATE SET n = entity
+                    RETURN entity.qname_id, id(n)
+                """
+            else:
+                entity_collection = collection.find(entity_filter or {}, projection)
+                query = get_create_entities_query(entity_class)
+            logger.debug(query)
+
+            # Created nodes are registered under each of their labels
+            handle_results = partial(
+                self.add_node_ids, tuple(entity_class.get_labels())
             )
 
+            # Bulk insert entities
+            batcher = self.get_batcher(entity_class.type)
+            for entity_bulk in batcher.batches(entity_collection):
+                params = {"entities": entity_bulk}
+                if self.mode == ComposeMode.UPSERT:
+                    params["run_id"] = self.run_id
+                yield query, params, len(entity_bulk), handle_results, batcher
+
+    def add_node_ids(self, labels: Iterable[str], results: list[tuple[int, int]]):
+        with self.lock:
+            for label in labels:
+                self.node_ids[label].update(results)
+
+    def get_node_ids(self, label: str, qname_ids: Iterable[int]) -> dict[int, int]:
+        """
+        Node IDs of the given entities. Incremental composition only creates
+        the changed entities, the others are looked up in the graph.
+        """
+        # Other workers add to the shared node IDs, so a snapshot is returned
+        qname_ids = set(qname_ids)
+        with self.lock:
+            label_node_ids = self.node_ids[label]
+            node_ids = {
+                qname_id: label_node_ids[qname_id]
+                for qname_id in qname_ids
+                if qname_id in label_node_ids
+            }
+        missing_qname_ids = list(qname_ids - node_ids.keys())
+        if missing_qname_ids and self.mode == ComposeMode.INCREMENTAL:
             query = f"""
-                UNWIND $entities AS entity
-                CREATE (n{entity_labels})
-                SET n = entity
+                UNWIND $qname_ids AS qname_id
+                MATCH (n:{label} {{qname_id: qname_id}})
+                RETURN qname_id, id(n)
             """
             logger.debug(query)
+            results = self.cypher_query(query, {"qname_ids": missing_qname_ids})
+            node_ids.update(results)
+            with self.lock:
+                self.node_ids[label].update(results)
+        return node_ids
 
-            # Bulk insert entities
-            for entity_bulk in bulk(entity_collection, 10000):
-                yield query, {"entities": entity_bulk}, len(entity_bulk)
-
-    def visit_relationships(self):
+    def visit_relationships(self, relationship_filter: dict = None):
+        relationship_filter = relationship_filter or {}
         for relationship_class in Relationship.visit_subclasses():
             relationship_type = relationship_class.type
             relationship_label = relationship_class.label
@@ -103,6 +567,7 @@ class GraphComposer:
 
             # Retrieve relationships by group
             pipeline = [
+                {"$match": relationship_filter},
                 {
                     "$group": {
                         "_id": {
@@ -128,34 +593,173 @@ class GraphComposer:
                 # Get relationship collection
                 relationships = collection.find(
                     {
+                        **relationship_filter,
                         "from_type": from_type,
                         "to_type": to_type,
                     },
                     {"_id": False},
                 )
 
-                cypher = f"""
-                    UNWIND $relationships AS relationship
-                    MATCH (a:{from_label} {{qualified_name: relationship.from_qualified_name}}), (b:{to_label} {{qualified_name: relationship.to_qualified_name}})
-                    CREATE (a)-[t:{relationship_label}]->(b)
-                    SET t = relationship
-                """
+                if self.mode == ComposeMode.UPSERT:
+                    cypher = f"""
+                        UNWIND $relationships AS relationship
+                        MATCH (a) WHERE id(a) = relationship.from_id
+                        MATCH (b) WHERE id(b) = relationship.to_id
+                        MERGE (a)-[t:{relationship_label} {{
+                            compose_key: relationship.key
+                        }}]->(b)
+                        SET t = relationship.properties,
+                            t.compose_key = relationship.key,
+                            t.compose_run = $run_id
+                    """
+                else:
+                    cypher = get_create_relationships_query(relationship_class)
                 logger.debug(cypher)
 
                 # Bulk insert relationships
-                for relationship in bulk(relationships, 10000):
-                    yield cypher, {"relationships": relationship}, len(relationship)
+                batcher = self.get_batcher(f"{relationship_type}.{from_type}.{to_type}")
+                site_counts = Counter()
+                for relationship_bulk in batcher.batches(relationships):
+                    rows = self.get_relationship_rows(
+                        relationship_bulk,
+                        from_label,
+                        to_label,
+                        relationship_type,
+                        site_counts,
+                    )
+                    params = {"relationships": rows}
+                    if self.mode == ComposeMode.UPSERT:
+                        params["run_id"] = self.run_id
+                    yield cypher, params, len(relationship_bulk), None, batcher
 
+    def get_relationship_rows(
+        self,
+        relationships: list[dict],
+        from_label: str,
+        to_label: str,
+        relationship_type: str = None,
+        site_counts: Counter = None,
+    ) -> list[dict]:
+        """
+        Pair relationships with their endpoint node IDs, dropping dangling ones.
+        When upserting, `site_counts` numbers the relationships sharing their
+        type, endpoints and file across the batches, in staging order.
+        """
+        from_node_ids = self.get_node_ids(
+            from_label, (r["from_qname_id"] for r in relationships)
+        )
+        to_node_ids = self.get_node_ids(
+            to_label, (r["to_qname_id"] for r in relationships)
+        )
 
-def bulk(iter: Iterable, size: int):
-    it = iter.__iter__()
-    while True:
-        batch = []
-        try:
-            for _ in range(size):
-                batch.append(next(it))
-        except StopIteration:
-            if batch:
-                yield batch
-            break
-        yield batch
+        site_counts = Counter() if site_counts is None else site_counts
+        rows = []
+        dropped_count = 0
+        for relationship in relationships:
+            if self.mode == ComposeMode.UPSERT:
+                site = (
+                    relationship["from_qname_id"],
+                    relationship["to_qname_id"],
+                    relationship.get("file_path"),
+                )
+                ordinal = site_counts[site]
+                site_counts[site] += 1
+
+            from_id = from_node_ids.get(relationship["from_qname_id"])
+            to_id = to_node_ids.get(relationship["to_qname_id"])
+            if from_id is None or to_id is None:
+                dropped_count += 1
+                continue
+            row = {"from_id": from_id, "to_id": to_id, "properties": relationship}
+            if self.mode == ComposeMode.UPSERT:
+                row["key"] = get_relationship_key(
+                    relationship_type, relationship, ordinal
+                )
+            rows.append(row)
+
+        with self.lock:
+            self.dropped_count += dropped_count
+        return rows
+
+
+def get_create_entities_query(entity_class: type[Entity]) -> str:
+    entity_labels = "".join(f":{label}" for label in entity_class.get_labels())
+    return f"""
+        UNWIND $entities AS entity
+        CREATE (n{entity_labels})
+        SET n = entity
+        RETURN entity.qname_id, id(n)
+    """
+
+
+def get_create_relationships_query(relationship_class: type[Relationship]) -> str:
+    """Relationships are created between nodes matched by their node IDs."""
+    return f"""
+        UNWIND $relationships AS relationship
+        MATCH (a) WHERE id(a) = relationship.from_id
+        MATCH (b) WHERE id(b) = relationship.to_id
+        CREATE (a)-[t:{relationship_class.label}]->(b)
+        SET t = relationship.properties
+    """
+
+
+def get_bucket_filter(bucket_count: int, from_bucket: int, to_bucket: int) -> dict:
+    return {
+        "from_qname_id": {"$mod": [bucket_count, from_bucket]},
+        "to_qname_id": {"$mod": [bucket_count, to_bucket]},
+    }
+
+
+def get_bucket_schedule(worker_count: int) -> list[list[list[tuple[int, int]]]]:
+    """
+    Rounds of tasks over twice as many buckets as workers, each task a list of
+    (from bucket, to bucket) pairs. The buckets are paired round robin, each
+    pair is visited in both directions by one task, and the first round also
+    visits every bucket with itself. Every pair of buckets is visited once,
+    and the tasks of a round never share a bucket.
+    """
+    bucket_count = 2 * worker_count
+    buckets = list(range(bucket_count))
+    bucket_rounds = []
+    for round_index in range(bucket_count - 1):
+        bucket_round = []
+        for index in range(worker_count):
+            a, b = buckets[index], buckets[-1 - index]
+            bucket_pairs = [(a, b), (b, a)]
+            if round_index == 0:
+                bucket_pairs += [(a, a), (b, b)]
+            bucket_round.append(bucket_pairs)
+        bucket_rounds.append(bucket_round)
+
+        # The first bucket stays in place while the others rotate
+        buckets = [buckets[0], buckets[-1], *buckets[1:-1]]
+    return bucket_rounds
+
+
+def get_relationship_key(
+    relationship_type: str, relationship: dict, ordinal: int
+) -> int:
+    """
+    Identity of a relationship across runs: its type, endpoints and file, and
+    its ordinal among the relationships sharing them. Identical sites in a
+    file stay distinct edges, and a relationship whose other properties
+    changed is updated in place.
+    """
+    identity = [
+        relationship_type,
+        relationship["from_qname_id"],
+        relationship["to_qname_id"],
+        relationship.get("file_path"),
+        ordinal,
+    ]
+    return get_qname_id(json.dumps(identity))
+
+
+def run_query(tx: ManagedTransaction, query: str, params: dict = None) -> list:
+    try:
+        return [record.values() for record in tx.run(query, params)]
+    except Neo4jError as e:
+        # Managed transactions would retry it as is
+        if is_batch_too_large(e):
+            raise BatchTooLarge(e.code) from e
+        raise
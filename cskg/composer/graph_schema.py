@@ -0,0 +1,108 @@
+from time import perf_counter
+from loguru import logger
+from neo4j.exceptions import ClientError
+from neomodel.util import Database as NeoDatabase
+
+from cskg.utils.entity import Entity
+from cskg.utils.relationship import Relationship
+
+
+class GraphSchema:
+    """
+    Constraints and indexes of the composed graph, planned per label rather
+    than per entity type. Internal and external entity types share their
+    labels, so one set per label covers both of them. Relationships are
+    indexed on their file path.
+    """
+
+    def __init__(self, neo_db: NeoDatabase, await_timeout: int = 600):
+        self.neo_db = neo_db
+        self.await_timeout = await_timeout
+        self.is_online = False
+
+    def plan(self) -> list[tuple[str, str]]:
+        """Names and creation queries of the schema items, one set per label."""
+        labels = sorted(
+            {entity_class.label for entity_class in Entity.visit_subclasses()}
+        )
+
+        schema_items = []
+        for label in labels:
+            # Qualified name IDs are only unique within an entity type
+            name = f"{label}_identity"
+            schema_items.append(
+                (
+                    name,
+                    f"""
+                    CREATE CONSTRAINT {name} IF NOT EXISTS
+                    FOR (n:{label}) REQUIRE (n.qname_id, n.type) IS UNIQUE
+                    """,
+                )
+            )
+
+            # Relationship endpoints are looked up on the qualified name ID,
+            # detectors on the qualified name, and retraction on the file path
+            for field in ("qname_id", "qualified_name", "file_path"):
+                name = f"{label}_{field}"
+                schema_items.append(
+                    (
+                        name,
+                        f"""
+                        CREATE INDEX {name} IF NOT EXISTS
+                        FOR (n:{label}) ON (n.{field})
+                        """,
+                    )
+                )
+
+        # Relationships are retracted on their file path as well
+        relationship_labels = sorted(
+            {
+                relationship_class.label
+                for relationship_class in Relationship.visit_subclasses()
+            }
+        )
+        for label in relationship_labels:
+            name = f"{label}_file_path"
+            schema_items.append(
+                (
+                    name,
+                    f"""
+                    CREATE INDEX {name} IF NOT EXISTS
+                    FOR ()-[r:{label}]-() ON (r.file_path)
+                    """,
+                )
+            )
+        return schema_items
+
+    def create(self):
+        for name, query in self.plan():
+            logger.debug(query)
+            try:
+                self.neo_db.cypher_query(query)
+            except ClientError as e:
+                logger.error(f"Failed to create {name}: {e}")
+        self.is_online = False
+
+    def await_online(self):
+        """Block until every index is populated, and report how long it took."""
+        if self.is_online:
+            return
+
+        start_time = perf_counter()
+        self.neo_db.cypher_query(
+            "CALL db.awaitIndexes($timeout)", {"timeout": self.await_timeout}
+        )
+        elapsed_time = perf_counter() - start_time
+        self.is_online = True
+
+        query = """
+            SHOW INDEXES
+            YIELD name, state, populationPercent
+            WHERE name IN $names AND state <> "ONLINE"
+            RETURN name, state, populationPercent
+        """
+        names = [name for name, query in self.plan()]
+        results, meta = self.neo_db.cypher_query(query, {"names": names})
+        for name, state, population_percent in results:
+            logger.warning(f"Index {name} is {state} ({population_percent:.0f}%)")
+        logger.info(f"Indexes online after {elapsed_time:.2f}s of population")
@@ -0,0 +1,76 @@
+from queue import Full, Queue
+from threading import Event, Thread
+from time import perf_counter
+from typing import Callable, Iterable
+
+# Marks the end of the prefetched items
+DONE = object()
+
+
+class Prefetcher:
+    """
+    Runs an iterable on a background thread and keeps up to `size` of its
+    items ready in a bounded queue, so the consumer works on one item while
+    the next ones are produced. Records how long items took to produce, and
+    how long each side was blocked waiting on the other.
+    """
+
+    def __init__(self, visit_items: Callable[[], Iterable], size: int = 2):
+        self.visit_items = visit_items
+        self.queue = Queue(size)
+        self.stopped = Event()
+        self.error: BaseException = None
+
+        self.read_time = 0.0
+        # Producer waiting on a full queue, the consumer is the bottleneck
+        self.read_blocked_time = 0.0
+        # Consumer waiting on an empty queue, the producer is the bottleneck
+        self.write_blocked_time = 0.0
+
+    def __iter__(self):
+        thread = Thread(target=self.produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                start_time = perf_counter()
+                item = self.queue.get()
+                self.write_blocked_time += perf_counter() - start_time
+                if item is DONE:
+                    break
+                yield item
+        finally:
+            self.stopped.set()
+            thread.join()
+
+        if self.error:
+            raise self.error
+
+    def produce(self):
+        items = None
+        try:
+            items = iter(self.visit_items())
+            while not self.stopped.is_set():
+                start_time = perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                self.read_time += perf_counter() - start_time
+                self.put(item)
+        except BaseException as e:
+            self.error = e
+        finally:
+            # Generators clean up on the thread that ran them
+            if hasattr(items, "close"):
+                items.close()
+            self.put(DONE)
+
+    def put(self, item):
+        start_time = perf_counter()
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except Full:
+                continue
+        self.read_blocked_time += perf_counter() - start_time
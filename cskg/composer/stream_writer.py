@@ -0,0 +1,258 @@
+import pickle
+from collections import Counter, defaultdict
+from functools import partial
+from queue import Queue
+from tempfile import TemporaryFile
+from threading import Thread
+from loguru import logger
+from neomodel import clear_neo4j_database
+from neomodel.util import Database as NeoDatabase
+
+from cskg.utils.entity import Entity
+from cskg.utils.relationship import Relationship
+from cskg.utils.graph_component import GraphComponent
+from cskg.composer.composer import (
+    get_create_entities_query,
+    get_create_relationships_query,
+    run_query,
+)
+from cskg.composer.graph_schema import GraphSchema
+
+
+class Neo4jComponentWriter:
+    """
+    Streams components from the interpreter straight into neo4j, without
+    staging them in mongo. Components are buffered per type and written in
+    batches on a background thread, behind a bounded queue. Buffered entities
+    are always written before a relationship batch, and relationships whose
+    endpoints are not in the graph yet are held back under the first missing
+    one, and retried once it is written. Past `max_deferred` of them, the
+    oldest are spilled to disk until the stream ends.
+
+    The graph is built from scratch, so it has to be empty unless
+    `clear_database` allows the writer to drop everything in it first.
+    """
+
+    def __init__(
+        self,
+        neo_db: NeoDatabase,
+        batch_size: int = 10000,
+        queue_size: int = 10000,
+        max_deferred: int = 100000,
+        clear_database: bool = False,
+    ):
+        self.neo_db = neo_db
+        self.batch_size = batch_size
+        self.clear_database = clear_database
+        self.queue: Queue[GraphComponent | None] = Queue(maxsize=queue_size)
+        self.entity_buffers: dict[str, list[dict]] = defaultdict(list)
+        self.relationship_buffer: list[dict] = []
+
+        # Relationships held back, keyed by the (label, qname_id) they miss
+        self.deferred_relationships: dict[tuple[str, int], list[dict]] = {}
+        self.deferred_count = 0
+        self.ready_relationships: list[dict] = []
+        self.max_deferred = max_deferred
+        self.spill_file = None
+        self.spilled_count = 0
+        self.seen_entities: set[tuple[str, int]] = set()
+        self.node_ids: dict[str, dict[int, int]] = defaultdict(dict)
+        self.labels: dict[str, str] = {}
+        self.inserted_counts = Counter()
+        self.duplicate_count = 0
+        self.dropped_count = 0
+        self.error: Exception = None
+        self.thread = Thread(target=self.run, name="neo4j-writer", daemon=True)
+
+        # The neomodel connection is thread local, the writer shares its driver
+        self.open_session = partial(
+            self.neo_db.driver.session, database=self.neo_db._database_name
+        )
+        self.session = None
+
+    def start(self):
+        if self.clear_database:
+            clear_neo4j_database(
+                self.neo_db, clear_constraints=True, clear_indexes=True
+            )
+        else:
+            results, _ = self.neo_db.cypher_query("MATCH (n) RETURN id(n) LIMIT 1")
+            if results:
+                raise ValueError(
+                    "Streaming builds the graph from scratch, but neo4j is not "
+                    "empty. Allow the writer to clear the database first."
+                )
+
+        # Indexes of an empty graph are online straight away, and are then
+        # kept up to date as nodes are created
+        graph_schema = GraphSchema(self.neo_db)
+        graph_schema.create()
+        graph_schema.await_online()
+
+        self.thread.start()
+
+    def write(self, component: GraphComponent):
+        if self.error:
+            raise self.error
+        self.queue.put(component)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def run(self):
+        component = ...
+        try:
+            with self.open_session() as session:
+                self.session = session
+                while (component := self.queue.get()) is not None:
+                    self.buffer(component)
+                self.flush_all()
+        except Exception as e:
+            self.error = e
+            # Keep draining so producers never block on a dead writer, unless
+            # the end of the stream has been taken off the queue already
+            while component is not None:
+                component = self.queue.get()
+        finally:
+            if self.spill_file:
+                self.spill_file.close()
+
+    def buffer(self, component: GraphComponent):
+        if isinstance(component, Entity):
+            key = (component.type, component.qname_id)
+            if key in self.seen_entities:
+                self.duplicate_count += 1
+                return
+            self.seen_entities.add(key)
+
+            document = dict(component)
+            for field in ("label", "extra_labels"):
+                document.pop(field)
+
+            buffer = self.entity_buffers[component.type]
+            buffer.append(document)
+            if len(buffer) >= self.batch_size:
+                self.flush_entities(component.type)
+
+        # Other components, such as call sites, only live in mongo
+        elif isinstance(component, Relationship):
+            self.relationship_buffer.append(dict(component))
+            if len(self.relationship_buffer) >= self.batch_size:
+                self.flush_relationships()
+
+    def flush_all(self):
+        self.flush_relationships()
+
+        # Endpoints still missing were never streamed
+        self.dropped_count += self.deferred_count
+        self.deferred_relationships = {}
+        self.deferred_count = 0
+
+        if self.spill_file:
+            self.spill_file.seek(0)
+            while True:
+                try:
+                    relationships = pickle.load(self.spill_file)
+                except EOFError:
+                    break
+                self.dropped_count += len(self.write_relationships(relationships))
+
+    def flush_entities(self, entity_type: str):
+        documents = self.entity_buffers.pop(entity_type, None)
+        if not documents:
+            return
+
+        entity_class = Entity.get_class(entity_type)
+        query = get_create_entities_query(entity_class)
+        results = self.session.execute_write(run_query, query, {"entities": documents})
+        for label in entity_class.get_labels():
+            self.node_ids[label].update(results)
+
+            # Relationships held back for these entities can be retried
+            for qname_id, _ in results:
+                relationships = self.deferred_relationships.pop((label, qname_id), [])
+                self.deferred_count -= len(relationships)
+                self.ready_relationships.extend(relationships)
+        self.inserted_counts[entity_type] += len(documents)
+
+    def flush_relationships(self):
+        # Relationships are only written once the entities before them are
+        for entity_type in list(self.entity_buffers.keys()):
+            self.flush_entities(entity_type)
+
+        relationships = self.ready_relationships + self.relationship_buffer
+        self.relationship_buffer = []
+        self.ready_relationships = []
+        self.defer(self.write_relationships(relationships))
+
+    def defer(self, relationships: list[tuple[tuple[str, int], dict]]):
+        for endpoint, relationship in relationships:
+            self.deferred_relationships.setdefault(endpoint, []).append(relationship)
+        self.deferred_count += len(relationships)
+
+        # Endpoints held back the longest are spilled first
+        while self.deferred_count > self.max_deferred:
+            if self.spill_file is None:
+                self.spill_file = TemporaryFile()
+            endpoint = next(iter(self.deferred_relationships))
+            overflow = self.deferred_relationships.pop(endpoint)
+            pickle.dump(overflow, self.spill_file)
+            self.deferred_count -= len(overflow)
+            self.spilled_count += len(overflow)
+
+    def write_relationships(
+        self, relationships: list[dict]
+    ) -> list[tuple[tuple[str, int], dict]]:
+        """
+        Write the relationships between existing nodes, and return the others
+        along with the first endpoint they miss.
+        """
+        rows_by_type: dict[str, list[dict]] = defaultdict(list)
+        unresolved_relationships = []
+        for relationship in relationships:
+            from_label = self.get_label(relationship["from_type"])
+            to_label = self.get_label(relationship["to_type"])
+            from_qname_id = relationship["from_qname_id"]
+            to_qname_id = relationship["to_qname_id"]
+            from_id = self.node_ids[from_label].get(from_qname_id)
+            to_id = self.node_ids[to_label].get(to_qname_id)
+            if from_id is None:
+                unresolved_relationships.append(
+                    ((from_label, from_qname_id), relationship)
+                )
+                continue
+            if to_id is None:
+                unresolved_relationships.append(((to_label, to_qname_id), relationship))
+                continue
+
+            rows_by_type[relationship["type"]].append(
+                {"from_id": from_id, "to_id": to_id, "properties": relationship}
+            )
+
+        for relationship_type, rows in rows_by_type.items():
+            relationship_class = Relationship.get_class(relationship_type)
+            query = get_create_relationships_query(relationship_class)
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start : start + self.batch_size]
+                self.session.execute_write(run_query, query, {"relationships": batch})
+            self.inserted_counts[relationship_type] += len(rows)
+
+        return unresolved_relationships
+
+    def get_label(self, entity_type: str) -> str:
+        if entity_type not in self.labels:
+            self.labels[entity_type] = Entity.get_class(entity_type).label
+        return self.labels[entity_type]
+
+    def report(self):
+        for component_type, count in sorted(self.inserted_counts.items()):
+            logger.info(f"{component_type}: {count} written to neo4j")
+        logger.info(
+            f"Total: {self.inserted_counts.total()} written to neo4j, "
+            f"{self.duplicate_count} duplicate entities, "
+            f"{self.dropped_count} relationships dropped, "
+            f"{self.spilled_count} spilled to disk while deferred"
+        )
@@ -5,33 +5,41 @@ from cskg.utils.graph_component import GraphComponent
 
 
 class BaseClassDependsOnSubclassDetector(AbstractDetector):
-    def detect(self):
-        self.result_collection = self.mongo_db.get_collection(
-            "base_class_depends_on_subclass"
-        )
+    result_collection_name = "base_class_depends_on_subclass"
+    result_indexes = (
+        "parent.qualified_name",
+        "parent.file_path",
+        "child.qualified_name",
+        "child.file_path",
+    )
 
+    def detect(self):
+        # Relationships are collected one pair at a time, so pairs stream out
         query = """
-            MATCH (parent:Class)-[relationship]->(child:Class)
-            WHERE NOT type(relationship) = "INHERITS" 
-                AND (child)-[:INHERITS]->(parent)
-            RETURN parent, child, COLLECT(relationship) AS relationships
+            MATCH (child:Class)-[:INHERITS]->(parent:Class)
+            WITH DISTINCT parent, child
+            CALL {
+                WITH parent, child
+                MATCH (parent)-[relationship]->(child)
+                WHERE NOT type(relationship) = "INHERITS"
+                RETURN COLLECT(properties(relationship)) AS relationships
+            }
+            WITH parent, child, relationships
+            WHERE size(relationships) > 0
+            RETURN parent, child, relationships
         """
         logger.debug(query)
 
-        results, meta = self.neo_db.cypher_query(query)
-
-        logger.debug(results)
-
-        for result in results:
-            parent_node, child_node, relationship_node = result
+        for result in self.stream_query(query):
+            parent_node, child_node, relationships = result
 
-            parent = GraphComponent.from_node(parent_node)
-            child = GraphComponent.from_node(child_node)
+            parent = GraphComponent.from_neo_node(parent_node)
+            child = GraphComponent.from_neo_node(child_node)
 
-            self.result_collection.insert_one(
+            self.result_sink.add(
                 {
                     "parent": parent,
                     "child": child,
-                    "relationships": relationship_node,
+                    "relationships": relationships,
                 }
             )
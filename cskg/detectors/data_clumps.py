@@ -1,81 +1,236 @@
+from array import array
 from collections import defaultdict
+from enum import StrEnum
 import math
-from typing import Iterable
-from neo4j.exceptions import ClientError
+from typing import Hashable, Iterable
 from loguru import logger
 from neo4j.graph import Path
 from tqdm import tqdm
 
 from cskg.detectors.detector import AbstractDetector
+from cskg.detectors.fp_growth import FpTree
+from cskg.detectors.scratch import ScratchWorkspace, get_scratch_label
 from cskg.utils.graph_component import GraphComponent
 from cskg.utils.relationship import TakesRel
+from cskg.utils.symbols import get_qname_id
+
+
+class FpGrowthEngine(StrEnum):
+    """
+    Where the FP tree is built and mined.
+
+    - `memory`: in flat arrays, from one streaming query of the transactions.
+    - `graph`: as scratch nodes in neo4j, the original implementation.
+    """
+
+    MEMORY = "memory"
+    GRAPH = "graph"
+
+
+class ItemFiles:
+    """
+    Files of the functions holding each item, to find where the functions
+    sharing an itemset are defined.
+    """
+
+    def __init__(self):
+        self.file_paths: list[str] = []
+        self.functions: dict[Hashable, set[int]] = defaultdict(set)
+
+    def add(self, file_path: str, items: Iterable[Hashable]):
+        function = len(self.file_paths)
+        self.file_paths.append(file_path)
+        for item in items:
+            self.functions[item].add(function)
+
+    def get(self, itemset: Iterable[Hashable]) -> list[str]:
+        function_sets = sorted(
+            (self.functions.get(item, set()) for item in itemset), key=len
+        )
+        if not function_sets:
+            return []
+        functions = function_sets[0].intersection(*function_sets[1:])
+        file_paths = {self.file_paths[function] for function in functions}
+        return sorted(file_paths - {None})
 
 
 class DataClumpsDetector(AbstractDetector):
     label = "DataClumps"
+    result_collection_name = "data_clumps"
+    # Itemsets are lists of [class qualified name, parameter name] pairs, found
+    # in the functions of the files listed along with them
+    result_indexes = ("itemset", "size", "file_paths")
+
+    def __init__(self, *args, engine: FpGrowthEngine = FpGrowthEngine.MEMORY, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.engine = engine
+
+        # The graph engine keeps its FP trees as scratch nodes
+        self.mutates_graph = engine == FpGrowthEngine.GRAPH
 
     def detect(self):
+        if self.engine == FpGrowthEngine.GRAPH:
+            self.detect_in_graph()
+        else:
+            self.detect_in_memory()
+
+    def detect_in_memory(self):
+        item_ids: dict[tuple[str, str], int] = {}
+        frequencies = array("q")
+        transactions: list[array] = []
+        item_files = ItemFiles()
+
+        # Parameters of hub types may be kept on the function instead of TAKES
+        query = f"""
+            MATCH (f:Function)
+            OPTIONAL MATCH (f)-[t:TAKES]->(c:Class)
+            WITH f,
+                COLLECT(c.qualified_name) AS class_qualified_names,
+                COLLECT(t.param_name) AS param_names
+            WHERE size(param_names) + size(coalesce(f.hub_param_names, [])) > 0
+            RETURN class_qualified_names + coalesce(f.hub_param_types, []),
+                param_names + coalesce(f.hub_param_names, []),
+                f.file_path
+        """
+        logger.debug(query)
+        for class_qualified_names, param_names, file_path in tqdm(
+            self.stream_query(query), desc="Reading transactions", unit="functions"
+        ):
+            transaction = array("q")
+            for item in zip(class_qualified_names, param_names):
+                item_id = item_ids.setdefault(item, len(item_ids))
+                if item_id == len(frequencies):
+                    frequencies.append(0)
+                transaction.append(item_id)
+
+            # Frequencies count functions, transactions need 3 parameters
+            for item_id in set(transaction):
+                frequencies[item_id] += 1
+            if len(transaction) >= 3:
+                transactions.append(transaction)
+                item_files.add(file_path, transaction)
+
+        # Rank the frequent items, most frequent first
+        items = sorted(
+            (item for item, item_id in item_ids.items() if frequencies[item_id] >= 2),
+            key=lambda item: (-frequencies[item_ids[item]], item),
+        )
+        ranks = {item_ids[item]: rank for rank, item in enumerate(items)}
+
+        fp_tree = FpTree()
+        for transaction in tqdm(
+            transactions, desc="Building FP Growth Tree", unit="functions"
+        ):
+            fp_tree.insert(
+                sorted(ranks[item_id] for item_id in transaction if item_id in ranks)
+            )
+        logger.info(f"FP tree of {len(fp_tree)} nodes for {len(items)} items")
+
+        for rank in tqdm(
+            range(len(items)), desc="Mining Conditional FP Trees", unit="items"
+        ):
+            for itemset, support_count in fp_tree.mine(rank):
+                itemset = [items[item] for item in itemset]
+                self.result_sink.add(
+                    {
+                        "itemset": itemset,
+                        "support_count": support_count,
+                        "size": len(itemset),
+                        "file_paths": item_files.get(
+                            [item_ids[item] for item in itemset]
+                        ),
+                    }
+                )
+
+    def detect_in_graph(self):
         self.root = FpTreeNode(
             class_qualified_name="<<Root>>",
             param_name="root",
             support_count=0,
         )
-        self.result_collection = self.mongo_db.get_collection("data_clumps")
-        self.result_collection.delete_many({})
         self.freq_table = defaultdict(int)
+        self.class_names: dict[int, str] = {}
+        self.item_files = ItemFiles()
+        self.workspace = ScratchWorkspace(self.label, self.cypher_query)
 
-        # Create root node of FP Growth tree
-        self.clear_conditional_fp_nodes()
-        self.clear_everything()
+        # Create root node of FP Growth tree, clearing any left by a failed run
+        self.workspace.clear()
         self.create_index()
         self.create_fp_tree_root()
 
         # Build FP-growth tree
-        self.get_frequency_table()
-        self.build_fp_growth_tree()
-        self.build_conditional_fp_tree()
+        try:
+            self.get_frequency_table()
+            self.build_fp_growth_tree()
+            self.build_conditional_fp_tree()
+        finally:
+            self.workspace.clear()
 
     def get_frequency_table(self):
+        # Parameters of hub types may be kept on the function instead of TAKES
         query = f"""
-            MATCH (c:Class)<-[t:TAKES]-(f:Function)
-            WITH c, t.param_name AS param_name, COUNT(DISTINCT f) AS frequency
+            CALL {{
+                MATCH (c:Class)<-[t:TAKES]-(f:Function)
+                RETURN c.qualified_name AS class_qualified_name,
+                    t.param_name AS param_name,
+                    f
+                UNION ALL
+                MATCH (f:Function)
+                WHERE f.hub_param_names IS NOT NULL
+                UNWIND range(0, size(f.hub_param_names) - 1) AS i
+                RETURN f.hub_param_types[i] AS class_qualified_name,
+                    f.hub_param_names[i] AS param_name,
+                    f
+            }}
+            WITH class_qualified_name, param_name, COUNT(DISTINCT f) AS frequency
             WHERE frequency >= 2
-            RETURN c, param_name, frequency
+            RETURN class_qualified_name, param_name, frequency
             ORDER BY frequency DESC
         """
-        results, meta = self.neo_db.cypher_query(query)
-        for result in results:
-            c, param_name, frequency = result
-            self.freq_table[c["qualified_name"], param_name] = frequency
+        for result in self.stream_query(query):
+            class_qualified_name, param_name, frequency = result
+            class_qname_id = get_qname_id(class_qualified_name)
+            self.freq_table[class_qname_id, param_name] = frequency
+            self.class_names[class_qname_id] = class_qualified_name
 
     def build_fp_growth_tree(self):
         query = f"""
-            MATCH (f:Function)-[t:TAKES]->(c:Class)
-            WITH f, COLLECT(t) AS ts, COUNT(t) AS ts_count
-            WHERE ts_count >= 3
+            MATCH (f:Function)
+            OPTIONAL MATCH (f)-[t:TAKES]->(:Class)
+            WITH f, COLLECT(t) AS ts
+            WHERE size(ts) + size(coalesce(f.hub_param_names, [])) >= 3
             RETURN f, ts
         """
-        results, meta = self.neo_db.cypher_query(query)
+        # Each transaction is inserted with queries of its own, so the functions
+        # are read up front rather than streamed
+        results = self.cypher_query(query)
         for result in tqdm(results, desc="Building FP Growth Tree", unit="functions"):
             f, ts = result
             takes_rels: list[TakesRel] = [GraphComponent.from_neo_node(t) for t in ts]
-            takes_rels = [
-                t
-                for t in takes_rels
-                if self.freq_table[t.to_qualified_name, t.param_name] >= 2
+            params = [(t.to_qname_id, t.param_name) for t in takes_rels]
+            params += [
+                (get_qname_id(class_qualified_name), param_name)
+                for param_name, class_qualified_name in zip(
+                    f.get("hub_param_names", []), f.get("hub_param_types", [])
+                )
             ]
-            takes_rels.sort(
-                key=lambda t: self.freq_table[t.to_qualified_name, t.param_name],
-                reverse=True,
+            params = [param for param in params if self.freq_table[param] >= 2]
+            params.sort(key=lambda param: self.freq_table[param], reverse=True)
+            self.item_files.add(
+                f.get("file_path"),
+                [
+                    (self.class_names[class_qname_id], param_name)
+                    for class_qname_id, param_name in params
+                ],
             )
 
             transaction = Transaction()
             transaction.append(self.root)
 
-            for takes_rel in takes_rels:
+            for class_qname_id, param_name in params:
                 item = FpTreeNode(
-                    param_name=takes_rel.param_name,
-                    class_qualified_name=takes_rel.to_qualified_name,
+                    param_name=param_name,
+                    class_qualified_name=self.class_names[class_qname_id],
                 )
                 transaction.append(item)
 
@@ -88,7 +243,9 @@ class DataClumpsDetector(AbstractDetector):
             desc="Building Conditional FP Tree",
             unit="nodes",
         )
-        for class_qualified_name, param_name in bar:
+        for class_qname_id, param_name in bar:
+            class_qualified_name = self.class_names[class_qname_id]
+
             # Create conditional FP tree
             query = f"""
                 MATCH path = (root:{FpTreeNode.label} {{
@@ -109,7 +266,7 @@ class DataClumpsDetector(AbstractDetector):
                 RETURN node
             """
             logger.debug(query)
-            self.neo_db.cypher_query(query)
+            self.cypher_query(query)
 
             # Propagate correct support counts
             query = f"""
@@ -119,7 +276,7 @@ class DataClumpsDetector(AbstractDetector):
                 SET parent.support_count = support_count
             """
             logger.debug(query)
-            self.neo_db.cypher_query(query)
+            self.cypher_query(query)
 
             # Query for frequent itemsets
             query = f"""
@@ -127,8 +284,7 @@ class DataClumpsDetector(AbstractDetector):
                 WHERE NOT (end)-[]->()
                 RETURN path
             """
-            paths, _ = self.neo_db.cypher_query(query)
-            for (path,) in paths:
+            for (path,) in self.stream_query(query):
                 path: Path
                 itemset = [(class_qualified_name, param_name)]
                 frequency = math.inf
@@ -141,11 +297,12 @@ class DataClumpsDetector(AbstractDetector):
                     frequency = min(frequency, cfp_node.support_count)
 
                 if len(interim_nodes) > 1:
-                    self.result_collection.insert_one(
+                    self.result_sink.add(
                         {
                             "itemset": itemset,
                             "support_count": frequency,
                             "size": len(itemset),
+                            "file_paths": self.item_files.get(itemset),
                         }
                     )
 
@@ -156,7 +313,7 @@ class DataClumpsDetector(AbstractDetector):
         self, transaction: "Transaction", labels: Iterable[str] = None
     ):
         if not labels:
-            labels = [self.label]
+            labels = [self.workspace.label]
 
         labels_str = "".join(map(lambda label: f":{label}", labels))
 
@@ -178,24 +335,25 @@ class DataClumpsDetector(AbstractDetector):
             ON MATCH
                 SET node.support_count = node.support_count + 1
         """
-        self.neo_db.cypher_query(query, {"items": transaction})
+        self.cypher_query(query, {"items": transaction})
 
         # Create relationships
         query = f"""
             UNWIND $rels AS rel
-            MATCH (parent:{self.label} {{
+            MATCH (parent:{self.workspace.label} {{
                 node_id: rel.parent_node_id
-            }}), (child:{self.label} {{
+            }}), (child:{self.workspace.label} {{
                 node_id: rel.child_node_id
             }})
             MERGE (parent)-[:LINKS]->(child)
         """
-        self.neo_db.cypher_query(query, {"rels": rels})
+        self.cypher_query(query, {"rels": rels})
 
     def create_fp_tree_root(self):
-        labels = "".join(map(lambda label: f":{label}", self.root.labels))
+        labels = [*self.root.labels, self.workspace.get_label("Root")]
+        labels = "".join(map(lambda label: f":{label}", labels))
         query = f"""
-            MERGE (root:Root{labels} {{node_id: $root.node_id}})
+            MERGE (root{labels} {{node_id: $root.node_id}})
             ON CREATE
                 SET root += $root
             ON MATCH
@@ -203,56 +361,26 @@ class DataClumpsDetector(AbstractDetector):
             RETURN root
         """
         logger.debug(query)
-        self.neo_db.cypher_query(query, {"root": self.root})
+        self.cypher_query(query, {"root": self.root})
 
     def create_index(self):
-        query = f"""
-            CREATE INDEX {self.label}_class_qname_param_name
-            FOR (n:{self.label})
-            ON (n.class_qualified_name, n.param_name)
-        """
-        try:
-            self.neo_db.cypher_query(query)
-        except ClientError as e:
-            logger.error(e)
-
-        query = f"""
-            CREATE INDEX {self.label}_node_id
-            FOR (n:{self.label})
-            ON (n.node_id)
-        """
-        try:
-            self.neo_db.cypher_query(query)
-        except ClientError as e:
-            logger.error(e)
-
-    def clear_everything(self):
-        query = f"""
-            MATCH (n: {self.label})
-            CALL {{ WITH n DETACH DELETE n }}
-            IN TRANSACTIONS OF 5000 rows
-        """
-        logger.debug(query)
-        self.neo_db.cypher_query(query)
-
-        # Drop indexes and constraints
-        query = f"""
-            CALL apoc.schema.assert({{}}, {{}})
-        """
-        self.neo_db.cypher_query(query)
+        self.workspace.create_index(
+            "class_qname_param_name", ("class_qualified_name", "param_name")
+        )
+        self.workspace.create_index("node_id", ("node_id",))
 
     def clear_conditional_fp_nodes(self):
         query = f"""
             MATCH (n: {ConditionalFpTreeNode.label})
             DETACH DELETE n
         """
-        self.neo_db.cypher_query(query)
+        self.cypher_query(query)
 
 
 class FpTreeNode(GraphComponent):
     type = "fp_tree_node"
-    label = "FpTreeNode"
-    extra_labels = (DataClumpsDetector.label,)
+    label = get_scratch_label(DataClumpsDetector.label, "FpTreeNode")
+    extra_labels = (get_scratch_label(DataClumpsDetector.label),)
 
     def __init__(
         self,
@@ -276,7 +404,7 @@ class FpTreeNode(GraphComponent):
 
 class ConditionalFpTreeNode(FpTreeNode):
     type = "conditional_fp_tree_node"
-    label = "ConditionalFpTreeNode"
+    label = get_scratch_label(DataClumpsDetector.label, "ConditionalFpTreeNode")
 
 
 class Transaction(list[FpTreeNode]): ...
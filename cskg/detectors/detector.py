@@ -1,21 +1,86 @@
 from abc import ABC, abstractmethod
+from functools import partial
+from time import perf_counter
+from typing import Generator
 from loguru import logger
 from pymongo.database import Database as MongoDatabase
+from neo4j import Session
 from neo4j.graph import Node
 from neomodel import Database as NeoDatabase
 
+from cskg.detectors.result_sink import ResultSink
 from cskg.utils.graph_component import GraphComponent
 from cskg.utils.mixins import VisitSubclassesMixin, CreateInstanceMixin
 
 
 class AbstractDetector(ABC, VisitSubclassesMixin, CreateInstanceMixin):
-    def __init__(self, mongo_db: MongoDatabase, neo_db: NeoDatabase):
+    # Detectors writing to the graph are never run alongside one another
+    mutates_graph = False
+
+    # Collection of the findings, and the fields they are looked up on
+    result_collection_name: str = None
+    result_indexes: tuple[str, ...] = ()
+
+    def __init__(
+        self, mongo_db: MongoDatabase, neo_db: NeoDatabase, fetch_size: int = 1000
+    ):
         self.mongo_db = mongo_db
         self.neo_db = neo_db
+        self.fetch_size = fetch_size
+        self.session: Session = None
+        self.result_sink: ResultSink = None
+        self.elapsed_time = 0.0
+
+        # The neomodel connection is thread local, detectors share its driver
+        self.open_session = partial(
+            self.neo_db.driver.session,
+            database=self.neo_db._database_name,
+            fetch_size=self.fetch_size,
+        )
 
     @abstractmethod
     def detect(self): ...
 
+    def run(self):
+        """
+        Detect on a session of the detector's own, and time it. The findings
+        replace those of the last run only once detection has succeeded.
+        """
+        start_time = perf_counter()
+        try:
+            self.result_sink = ResultSink(
+                self.mongo_db, self.result_collection_name, self.result_indexes
+            )
+            self.result_sink.open()
+            try:
+                with self.open_session() as session:
+                    self.session = session
+                    try:
+                        self.detect()
+                    finally:
+                        self.session = None
+            except BaseException:
+                self.result_sink.abort()
+                raise
+            self.result_sink.commit()
+        finally:
+            self.elapsed_time = perf_counter() - start_time
+
+    def cypher_query(self, query: str, params: dict = None) -> list:
+        """Run a query in an auto-commit transaction of the detector's session."""
+        return [record.values() for record in self.session.run(query, params)]
+
+    def stream_query(
+        self, query: str, params: dict = None
+    ) -> Generator[list, None, None]:
+        """
+        Yield the records of a query as they arrive, pulled `fetch_size` at a
+        time. Another query on the session buffers whatever is left, so only
+        mongo is written to while streaming.
+        """
+        for record in self.session.run(query, params):
+            yield record.values()
+
     def result_to_ent(self, nodes: list[Node]):
         components = []
         for node in nodes:
@@ -0,0 +1,84 @@
+from array import array
+from collections import defaultdict
+from typing import Generator, Iterable
+
+
+class FpTree:
+    """
+    FP tree kept in flat arrays rather than as graph nodes. Node 0 is the
+    root, and every other node keeps its parent, item, depth and support count
+    at its own index. Items are integers ranked by frequency, so transactions
+    are inserted in ascending order.
+    """
+
+    ROOT = 0
+
+    def __init__(self):
+        self.parents = array("q", [-1])
+        self.items = array("q", [-1])
+        self.depths = array("q", [0])
+        self.support_counts = array("q", [0])
+        self.children: dict[tuple[int, int], int] = {}
+        self.item_nodes: dict[int, list[int]] = defaultdict(list)
+
+    def __len__(self):
+        return len(self.items)
+
+    def insert(self, transaction: Iterable[int]):
+        node = self.ROOT
+        self.support_counts[node] += 1
+        for item in transaction:
+            child = self.children.get((node, item))
+            if child is None:
+                child = len(self.items)
+                self.parents.append(node)
+                self.items.append(item)
+                self.depths.append(self.depths[node] + 1)
+                self.support_counts.append(0)
+                self.children[node, item] = child
+                self.item_nodes[item].append(child)
+            self.support_counts[child] += 1
+            node = child
+
+    def get_prefix(self, node: int) -> list[int]:
+        """Nodes between the root and the node, from the root down."""
+        prefix = []
+        node = self.parents[node]
+        while node != self.ROOT:
+            prefix.append(node)
+            node = self.parents[node]
+        prefix.reverse()
+        return prefix
+
+    def mine(
+        self, item: int, min_support: int = 2, min_length: int = 3
+    ) -> Generator[tuple[list[int], int], None, None]:
+        """
+        Yield the itemsets ending in the item, with their support counts.
+
+        The conditional tree of the item is made of the paths from the root
+        to its nodes, and each prefix node is supported by the item nodes
+        below it. Every suffix of more than one prefix node, together with the
+        item, makes an itemset supported by its least supported node.
+        """
+        end_nodes = [
+            node
+            for node in self.item_nodes.get(item, [])
+            if self.support_counts[node] >= min_support
+            and self.depths[node] >= min_length
+        ]
+
+        conditional_counts: dict[int, int] = defaultdict(int)
+        prefixes = []
+        for end_node in end_nodes:
+            prefix = self.get_prefix(end_node)
+            for node in prefix:
+                conditional_counts[node] += self.support_counts[end_node]
+            prefixes.append(prefix)
+
+        for prefix in prefixes:
+            for start in range(len(prefix) - 1):
+                suffix = prefix[start:]
+                itemset = [item] + [self.items[node] for node in suffix]
+                support_count = min(conditional_counts[node] for node in suffix)
+                yield itemset, support_count
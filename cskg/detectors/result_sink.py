@@ -0,0 +1,84 @@
+from time import time
+from typing import Iterable
+from uuid import uuid4
+from loguru import logger
+from pymongo.database import Database as MongoDatabase
+
+
+class ResultSink:
+    """
+    Buffers the findings of a detector and writes them with unordered bulk
+    inserts into a staging collection. Once the run is done the staging
+    collection, indexes included, is renamed over the detector's collection,
+    so readers see the findings of either the last run or this one.
+
+    Staging collections are named after the time their run started. Those
+    older than `stale_after` seconds are left behind by runs that died, and
+    dropped, while the younger ones may belong to concurrent runs.
+    """
+
+    def __init__(
+        self,
+        mongo_db: MongoDatabase,
+        collection_name: str,
+        indexes: Iterable[str] = (),
+        batch_size: int = 1000,
+        stale_after: float = 24 * 60 * 60,
+    ):
+        if not collection_name:
+            raise ValueError("Findings need a result collection name")
+
+        self.mongo_db = mongo_db
+        self.collection_name = collection_name
+        self.indexes = indexes
+        self.batch_size = batch_size
+        self.stale_after = stale_after
+        self.buffer: list[dict] = []
+        self.inserted_count = 0
+
+        self.staging_prefix = f"{collection_name}.staging."
+        staging_name = f"{self.staging_prefix}{int(time())}.{uuid4().hex}"
+        self.staging_collection = self.mongo_db.get_collection(staging_name)
+
+    def open(self):
+        # Left behind by runs that died before they could commit or abort
+        stale_time = time() - self.stale_after
+        for name in self.mongo_db.list_collection_names():
+            if not name.startswith(self.staging_prefix):
+                continue
+            if get_staging_time(name.removeprefix(self.staging_prefix)) < stale_time:
+                logger.info(f"Dropping stale staging collection {name}")
+                self.mongo_db.drop_collection(name)
+
+        # Created up front, so that a run without findings still replaces the last
+        self.mongo_db.create_collection(self.staging_collection.name)
+        for field in self.indexes:
+            self.staging_collection.create_index(field)
+
+    def add(self, finding: dict):
+        self.buffer.append(finding)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.staging_collection.insert_many(self.buffer, ordered=False)
+        self.inserted_count += len(self.buffer)
+        self.buffer = []
+
+    def commit(self):
+        """Replace the detector's collection with the findings of this run."""
+        self.flush()
+        self.staging_collection.rename(self.collection_name, dropTarget=True)
+        logger.info(f"{self.collection_name}: {self.inserted_count} findings")
+
+    def abort(self):
+        self.buffer = []
+        self.staging_collection.drop()
+
+
+def get_staging_time(staging_suffix: str) -> float:
+    """Start time of a staging collection, 0 if it predates timestamped names."""
+    timestamp = staging_suffix.split(".")[0]
+    return int(timestamp) if timestamp.isdigit() else 0
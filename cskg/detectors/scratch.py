@@ -0,0 +1,58 @@
+from typing import Callable, Iterable
+from loguru import logger
+
+SCRATCH_PREFIX = "Scratch"
+
+
+def get_scratch_label(namespace: str, name: str = None) -> str:
+    """Label of the scratch nodes of a namespace, e.g. `Scratch_DataClumps`."""
+    parts = (SCRATCH_PREFIX, namespace, name) if name else (SCRATCH_PREFIX, namespace)
+    return "_".join(parts)
+
+
+class ScratchWorkspace:
+    """
+    Namespace for the intermediate nodes a detector keeps in the graph. Every
+    scratch node carries the namespace label, and every scratch index is named
+    after it, so cleanup only ever matches scratch nodes and scratch indexes
+    and leaves the schema of the composed graph alone.
+    """
+
+    def __init__(self, namespace: str, cypher_query: Callable[..., list]):
+        self.namespace = namespace
+        self.label = get_scratch_label(namespace)
+        self.cypher_query = cypher_query
+
+    def get_label(self, name: str) -> str:
+        return get_scratch_label(self.namespace, name)
+
+    def create_index(self, name: str, properties: Iterable[str]):
+        index_name = f"{self.label}_{name}"
+        fields = ", ".join(f"n.{property}" for property in properties)
+        query = f"""
+            CREATE INDEX {index_name} IF NOT EXISTS
+            FOR (n:{self.label})
+            ON ({fields})
+        """
+        logger.debug(query)
+        self.cypher_query(query)
+
+    def clear(self):
+        """Delete the scratch nodes and drop the scratch indexes."""
+        query = f"""
+            MATCH (n:{self.label})
+            CALL {{ WITH n DETACH DELETE n }}
+            IN TRANSACTIONS OF 5000 ROWS
+        """
+        logger.debug(query)
+        self.cypher_query(query)
+
+        query = """
+            SHOW INDEXES
+            YIELD name
+            WHERE name STARTS WITH $prefix
+            RETURN name
+        """
+        results = self.cypher_query(query, {"prefix": f"{self.label}_"})
+        for (index_name,) in results:
+            self.cypher_query(f"DROP INDEX {index_name} IF EXISTS")
@@ -5,9 +5,10 @@ from cskg.utils.graph_component import GraphComponent
 
 
 class SpeculativeGeneralityDetector(AbstractDetector):
-    def detect(self):
-        self.result_collection = self.mongo_db.get_collection("speculative_generality")
+    result_collection_name = "speculative_generality"
+    result_indexes = ("entity.qualified_name", "entity.file_path")
 
+    def detect(self):
         query = """
             MATCH (cls:Class {is_abstract: true})
             OPTIONAL MATCH (cls)<-[:INHERITS]-(inheriting_class)
@@ -18,14 +19,10 @@ class SpeculativeGeneralityDetector(AbstractDetector):
         """
         logger.debug(query)
 
-        results, meta = self.neo_db.cypher_query(query)
-
-        logger.debug(results)
-
-        for result in results:
+        for result in self.stream_query(query):
             cls_node, inherits_count = result
             ent = GraphComponent.from_neo_node(cls_node)
-            self.result_collection.insert_one(
+            self.result_sink.add(
                 {
                     "entity": ent,
                     "inherits_count": inherits_count,
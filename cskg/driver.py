@@ -1,21 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 from pymongo import MongoClient
 import neomodel
 from os.path import abspath
 from loguru import logger
 
 from cskg.interpreter.interpreter import CodeInterpreter
-from cskg.composer.composer import GraphComposer
+from cskg.interpreter.writer import MongoComponentWriter
+from cskg.composer.composer import GraphComposer, ComposeMode
+from cskg.composer.stream_writer import Neo4jComponentWriter
 from cskg.detectors.detector import AbstractDetector
 
 
 class Driver:
-    def __init__(self, folder_path: str, neo4j_url: str, mongo_url: str):
+    def __init__(
+        self,
+        folder_path: str,
+        neo4j_url: str,
+        mongo_url: str,
+        workers: int = 1,
+        incremental: bool = False,
+        interpreter_options: dict = None,
+        bulk_import_path: str = None,
+        upsert: bool = False,
+        stream: bool = False,
+        stream_to_mongo: bool = False,
+        detect_workers: int = 1,
+        fetch_size: int = 1000,
+    ):
+        # Streaming always builds the graph from scratch
+        if stream and (incremental or upsert):
+            raise ValueError("Streaming cannot compose incrementally or upsert")
+
         self.folder_path = folder_path
         self.folder_abs_path = abspath(folder_path)
         self.neo4j_url = neo4j_url
         self.is_neo4j_connected = False
         self.mongo_url = mongo_url
         self.is_mongo_connected = False
+        self.workers = workers
+        self.incremental = incremental
+        self.interpreter_options = interpreter_options or {}
+        self.bulk_import_path = bulk_import_path
+        self.upsert = upsert
+        self.stream = stream
+        self.stream_to_mongo = stream_to_mongo
+        self.detect_workers = detect_workers
+        self.fetch_size = fetch_size
 
         # Connect to neo4j
         try:
@@ -56,17 +87,25 @@ class Driver:
         if not self.is_neo4j_connected and not self.is_mongo_connected:
             return
 
-        # Interpretate codebase
-        if interpret:
-            logger.info("Interpreting code")
-            self.interpret_code()
-            logger.info("Interpretation done")
-
-        # Compose graph
-        if compose:
-            logger.info("Composing graph")
-            self.compose_graph()
-            logger.info("Composition done")
+        # Interpret straight into the graph, staging in mongo only on request
+        if self.stream:
+            if interpret or compose:
+                logger.info("Streaming code into graph")
+                self.stream_code()
+                logger.info("Streaming done")
+
+        else:
+            # Interpretate codebase
+            if interpret:
+                logger.info("Interpreting code")
+                self.interpret_code()
+                logger.info("Interpretation done")
+
+            # Compose graph
+            if compose:
+                logger.info("Composing graph")
+                self.compose_graph()
+                logger.info("Composition done")
 
         # Detect smells
         if detect:
@@ -75,17 +114,103 @@ class Driver:
             logger.info("Detection done")
 
     def interpret_code(self):
-        interpreter = CodeInterpreter(self.folder_path, self.code_interpreter_db)
+        interpreter = CodeInterpreter(
+            self.folder_path,
+            self.code_interpreter_db,
+            workers=self.workers,
+            incremental=self.incremental,
+            **self.interpreter_options,
+        )
         interpreter.interpret()
 
+    def stream_code(self):
+        mongo_db = self.code_interpreter_db if self.stream_to_mongo else None
+        interpreter = CodeInterpreter(
+            self.folder_path,
+            mongo_db,
+            workers=self.workers,
+            **self.interpreter_options,
+        )
+
+        # Streaming rebuilds the graph, like a composition from scratch
+        writers = [Neo4jComponentWriter(self.neo_db, clear_database=True)]
+        if mongo_db is not None:
+            writers.append(
+                MongoComponentWriter(mongo_db, batch_size=interpreter.write_batch_size)
+            )
+        interpreter.interpret(writers)
+
+        # The staged components are already in the graph
+        if interpreter.file_hashes:
+            changed_files, deleted_files = interpreter.file_hashes.get_pending()
+            interpreter.file_hashes.acknowledge(changed_files + deleted_files)
+
     def compose_graph(self):
-        graph_composer = GraphComposer(self.code_interpreter_db, self.neo_db)
+        if self.bulk_import_path:
+            graph_composer = GraphComposer(
+                self.code_interpreter_db,
+                self.neo_db,
+                mode=ComposeMode.BULK_IMPORT,
+                import_path=self.bulk_import_path,
+            )
+        else:
+            if self.upsert:
+                mode = ComposeMode.UPSERT
+            elif self.incremental:
+                mode = ComposeMode.INCREMENTAL
+            else:
+                mode = ComposeMode.REBUILD
+            graph_composer = GraphComposer(
+                self.code_interpreter_db, self.neo_db, mode=mode, workers=self.workers
+            )
         graph_composer.compose()
 
     def detect_smells(self):
-        for detector_class in AbstractDetector.visit_subclasses():
-            detector = detector_class.create_instance(self.code_smells_db, self.neo_db)
-            detector.detect()
+        detectors = [
+            detector_class.create_instance(
+                self.code_smells_db, self.neo_db, fetch_size=self.fetch_size
+            )
+            for detector_class in AbstractDetector.visit_subclasses()
+        ]
+
+        # Reported even when a detector fails, for the time the others took
+        start_time = perf_counter()
+        try:
+            if self.detect_workers > 1:
+                self.detect_in_parallel(detectors)
+            else:
+                for detector in detectors:
+                    detector.run()
+        finally:
+            elapsed_time = perf_counter() - start_time
+            self.report_detection(detectors, elapsed_time)
+
+    def report_detection(self, detectors: list[AbstractDetector], elapsed_time: float):
+        for detector in sorted(detectors, key=lambda d: d.elapsed_time, reverse=True):
+            logger.info(f"{type(detector).__name__}: {detector.elapsed_time:.2f}s")
+        logger.info(f"Detection took {elapsed_time:.2f}s")
+
+    def detect_in_parallel(self, detectors: list[AbstractDetector]):
+        """
+        Run the detectors on a pool of workers. Those mutating the graph share
+        one worker and run one after another, the others run on their own.
+        """
+        mutating_detectors = [d for d in detectors if d.mutates_graph]
+
+        def run_mutating_detectors():
+            for detector in mutating_detectors:
+                detector.run()
+
+        with ThreadPoolExecutor(self.detect_workers) as executor:
+            futures = [
+                executor.submit(detector.run)
+                for detector in detectors
+                if not detector.mutates_graph
+            ]
+            if mutating_detectors:
+                futures.append(executor.submit(run_mutating_detectors))
+            for future in futures:
+                future.result()
 
     def __del__(self):
         self.mongo_client.close()
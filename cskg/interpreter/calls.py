@@ -0,0 +1,51 @@
+from typing import Generator
+
+from cskg.utils.graph_component import GraphComponent
+from cskg.utils.relationship import CallSite, CallsRel
+
+
+class CallAggregator:
+    """
+    Collapses the call sites of a file into one CALLS edge per caller and
+    callee, carrying the number of calls and their distinct argument
+    signatures. Call sites can be kept on the side, with their line numbers.
+    """
+
+    def __init__(self, keep_call_sites: bool = False):
+        self.keep_call_sites = keep_call_sites
+        self.calls: dict[tuple[int, int], CallsRel] = {}
+        self.call_counts: dict[tuple[int, int], int] = {}
+        self.argument_signatures: dict[tuple[int, int], set[str]] = {}
+
+    def add(self, calls_rel: CallsRel) -> Generator[GraphComponent, None, None]:
+        key = (calls_rel.from_qname_id, calls_rel.to_qname_id)
+        self.calls.setdefault(key, calls_rel)
+        self.call_counts[key] = self.call_counts.get(key, 0) + 1
+        self.argument_signatures.setdefault(key, set()).add(
+            ", ".join(calls_rel.arguments)
+        )
+
+        if self.keep_call_sites:
+            yield CallSite(
+                from_qname_id=calls_rel.from_qname_id,
+                to_qname_id=calls_rel.to_qname_id,
+                file_path=calls_rel.file_path,
+                lineno=calls_rel.lineno,
+                arguments=calls_rel.arguments,
+            )
+
+    def flush(self) -> Generator[CallsRel, None, None]:
+        for key, calls_rel in self.calls.items():
+            yield CallsRel(
+                from_type=calls_rel.from_type,
+                from_qualified_name=calls_rel.from_qualified_name,
+                to_type=calls_rel.to_type,
+                to_qualified_name=calls_rel.to_qualified_name,
+                file_path=calls_rel.file_path,
+                call_count=self.call_counts[key],
+                argument_signatures=sorted(self.argument_signatures[key]),
+            )
+
+        self.calls.clear()
+        self.call_counts.clear()
+        self.argument_signatures.clear()
@@ -1,14 +1,15 @@
-from astroid import ClassDef
+from astroid import ClassDef, FunctionDef
 from loguru import logger
 
 from cskg.utils.entity import ModuleEntity, ClassEntity
 from cskg.utils.relationship import ContainsRel, InheritsRel
-from cskg.interpreter.utils import visit_external_entity
+from cskg.interpreter.utils import AnalysisLevel, visit_external_entity
+from cskg.interpreter.functions import get_function_entity_type
 from cskg.interpreter.nodes import visit_children
 from cskg.interpreter.vars import visit_local_variables
 
 
-def visit_class(cls: ClassDef):
+def visit_class(cls: ClassDef, level: AnalysisLevel = AnalysisLevel.FULL):
     name = cls.name
     qualified_name = cls.qname()
     module_qname = cls.root().qname()
@@ -24,14 +25,23 @@ def visit_class(cls: ClassDef):
     )
     yield class_ent
 
-    # Module contains class
-    contains_mc_rel = ContainsRel(
-        from_type=ModuleEntity,
-        from_qualified_name=module_qname,
-        to_type=ClassEntity,
-        to_qualified_name=qualified_name,
-    )
-    yield contains_mc_rel
+    # Classes defined in a function belong to it, others to the module
+    scope = cls.parent.frame()
+    if isinstance(scope, FunctionDef):
+        contains_rel = ContainsRel(
+            from_type=get_function_entity_type(scope),
+            from_qualified_name=scope.qname(),
+            to_type=ClassEntity,
+            to_qualified_name=qualified_name,
+        )
+    else:
+        contains_rel = ContainsRel(
+            from_type=ModuleEntity,
+            from_qualified_name=module_qname,
+            to_type=ClassEntity,
+            to_qualified_name=qualified_name,
+        )
+    yield contains_rel
 
     # Visit parents
     parent_classes = cls.ancestors(recurs=False)
@@ -48,9 +58,8 @@ def visit_class(cls: ClassDef):
         )  # CHILD -[INHERITS]-> PARENT
         yield inherits_rel
 
-    # Visit children
-    yield from visit_children(cls)
-    yield from visit_local_variables(cls)
+    yield from visit_children(cls, level)
+    yield from visit_local_variables(cls, level)
 
 
 def is_abstract_class(cls: ClassDef):
@@ -61,8 +70,46 @@ def is_abstract_class(cls: ClassDef):
             return True
 
     # Check if it inherits from ABC
-    for parent in cls.ancestors():
+    return inherits_abc(cls)
+
+
+# Memoized per class, so shared ancestors are only walked once
+_inherits_abc: dict[ClassDef, bool] = {}
+
+
+def inherits_abc(cls: ClassDef) -> bool:
+    result, _ = walk_inherits_abc(cls, set())
+    return result
+
+
+def walk_inherits_abc(cls: ClassDef, walking: set[ClassDef]) -> tuple[bool, bool]:
+    """
+    Check the bases of the class, returning whether it inherits from ABC and
+    whether the answer is complete. A cycle in the bases cuts the walk short,
+    and a negative answer found that way is not memoized.
+    """
+    if cls in _inherits_abc:
+        return _inherits_abc[cls], True
+    if cls in walking:
+        return False, False
+
+    walking.add(cls)
+    result, is_complete = False, True
+    for parent in cls.ancestors(recurs=False):
         if parent.name == "ABC":
-            return True
+            result = True
+            break
+        parent_result, parent_is_complete = walk_inherits_abc(parent, walking)
+        is_complete = is_complete and parent_is_complete
+        if parent_result:
+            result = True
+            break
+    walking.discard(cls)
+
+    if result or is_complete:
+        _inherits_abc[cls] = result
+    return result, result or is_complete
+
 
-    return False
+def clear_abstract_class_cache():
+    _inherits_abc.clear()
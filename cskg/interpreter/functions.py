@@ -6,22 +6,24 @@ from astroid import (
     ParentMissingError,
     Lambda,
 )
-from astroid.nodes import LocalsDictNodeNG, BaseContainer
+from astroid.nodes import LocalsDictNodeNG, BaseContainer, NodeNG
 from loguru import logger
 
 from cskg.utils.entity import FunctionEntity, MethodEntity, ModuleEntity, ClassEntity
 from cskg.utils.relationship import ContainsRel, ReturnsRel, CallsRel, YieldsRel
 from cskg.interpreter.utils import (
+    AnalysisLevel,
     FunctionType,
     get_inferred_type,
     get_inferred_types,
     visit_external_entity,
 )
+from cskg.interpreter.nodes import visit_node
 from cskg.interpreter.params import visit_parameters
 from cskg.interpreter.vars import visit_local_variables
 
 
-def visit_function(function: FunctionDef):
+def visit_function(function: FunctionDef, level: AnalysisLevel = AnalysisLevel.FULL):
     name = function.name
     qualified_name = function.qname()
     file_path = function.root().file
@@ -42,15 +44,26 @@ def visit_function(function: FunctionDef):
         )
         yield function_ent
 
-        # Module
-        module = function.root()
-        contains_mf_rel = ContainsRel(
-            from_type=ModuleEntity,
-            from_qualified_name=module.qname(),
-            to_type=FunctionEntity,
-            to_qualified_name=qualified_name,
-        )
-        yield contains_mf_rel
+        # Functions defined in a function belong to it, others to the module
+        scope = function.parent.frame()
+        if isinstance(scope, FunctionDef):
+            contains_ff_rel = ContainsRel(
+                from_type=get_function_entity_type(scope),
+                from_qualified_name=scope.qname(),
+                to_type=FunctionEntity,
+                to_qualified_name=qualified_name,
+            )
+            yield contains_ff_rel
+        else:
+            # Module
+            module = function.root()
+            contains_mf_rel = ContainsRel(
+                from_type=ModuleEntity,
+                from_qualified_name=module.qname(),
+                to_type=FunctionEntity,
+                to_qualified_name=qualified_name,
+            )
+            yield contains_mf_rel
 
     else:
         # Method
@@ -77,97 +90,132 @@ def visit_function(function: FunctionDef):
         )
         yield contains_cf_rel
 
-    yield from visit_function_called_nodes(function)
-    yield from visit_function_return_node(function)
-    yield from visit_function_yield_node(function)
-    yield from visit_local_variables(function)
+    calls, definitions = walk_function(function)
+    for call in calls:
+        yield from visit_function_call(function, call, level)
+    if level == AnalysisLevel.FULL:
+        yield from visit_function_return_node(function)
+        yield from visit_function_yield_node(function)
+    yield from visit_local_variables(function, level)
     yield from visit_parameters(function, function_subtype)
 
+    for definition in definitions:
+        yield from visit_node(definition, level)
 
-def visit_function_called_nodes(function: FunctionDef):
+
+def walk_function(function: FunctionDef) -> tuple[list[Call], list[NodeNG]]:
     """
-    Visit body and write down node function calls other functions.
+    Walk the function once, collecting its call sites and the classes and
+    functions defined in it. Those definitions are not entered, their calls
+    are their own, while calls in lambdas and comprehensions stay with the
+    function.
     """
-
-    calls = list(function.nodes_of_class(Call))
-    for call in calls:
-        # Arguments
-        args = call.args  # The positional arguments being given to the call
-        keywords = call.keywords  # The keyword arguments being given to the call
-
-        arguments = []
-
-        for arg in args:
-            inferred_node = get_inferred_type(arg)
-            argument_type = get_inferred_node_qname(inferred_node)
-            arguments.append(argument_type)
-
-        for keyword in keywords:
-            arg_name = keyword.arg
-            if not arg_name:
-                continue
-            inferred_node = get_inferred_type(keyword.value)
-            argument_type = get_inferred_node_qname(inferred_node)
-            arguments.append(f"{arg_name}={argument_type}")
-
-        # Callee function
-        called_func = call.func  # What is being called
-        inferred_node = get_inferred_type(called_func)
-        if not isinstance(inferred_node, LocalsDictNodeNG):
-            # logger.error(f"Could not infer function call (soft): {called_func}")
+    calls = []
+    definitions = []
+
+    # Children are pushed in reverse to be visited in source order
+    stack = list(reversed(list(function.get_children())))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (FunctionDef, ClassDef)):
+            definitions.append(node)
             continue
+        if isinstance(node, Call):
+            calls.append(node)
+        stack.extend(reversed(list(node.get_children())))
 
-        yield from visit_external_entity(inferred_node)
+    return calls, definitions
 
-        if isinstance(inferred_node, FunctionDef) or isinstance(inferred_node, Lambda):
-            to_type = FunctionEntity
-        elif isinstance(inferred_node, ClassDef):
-            to_type = ClassEntity
-        elif isinstance(inferred_node, Module):
-            to_type = ModuleEntity
-        else:
-            raise ValueError(f"Unknown type {inferred_node}")
 
-        function_qualified_name = function.qname()
-        callee_qualified_name = inferred_node.qname()
-        calls_rel = CallsRel(
-            from_type=FunctionEntity,
-            from_qualified_name=function_qualified_name,
-            to_type=to_type,
-            to_qualified_name=callee_qualified_name,
-            arguments=arguments,
-        )
+def visit_function_call(
+    function: FunctionDef, call: Call, level: AnalysisLevel = AnalysisLevel.FULL
+):
+    """
+    Write down a call the function makes to another function.
+    """
+    # Arguments
+    args = call.args  # The positional arguments being given to the call
+    keywords = call.keywords  # The keyword arguments being given to the call
 
-        yield calls_rel
+    arguments = []
 
-        # Lambda function need to be visited
-        if isinstance(inferred_node, Lambda):
-            called_name = inferred_node.name
+    # Argument types are only inferred at full analysis
+    infer_arguments = level == AnalysisLevel.FULL
 
-            lambda_ent = FunctionEntity(
-                name=called_name,
-                qualified_name=callee_qualified_name,
-                file_path=inferred_node.root().file,
-                subtype=FunctionType.LAMBDA,
-            )
+    for arg in args:
+        inferred_node = get_inferred_type(arg) if infer_arguments else None
+        argument_type = get_inferred_node_qname(inferred_node)
+        arguments.append(argument_type)
 
-            yield lambda_ent
+    for keyword in keywords:
+        arg_name = keyword.arg
+        if not arg_name:
+            continue
+        inferred_node = get_inferred_type(keyword.value) if infer_arguments else None
+        argument_type = get_inferred_node_qname(inferred_node)
+        arguments.append(f"{arg_name}={argument_type}")
+
+    # Callee function
+    called_func = call.func  # What is being called
+    inferred_node = get_inferred_type(called_func)
+    if not isinstance(inferred_node, LocalsDictNodeNG):
+        # logger.error(f"Could not infer function call (soft): {called_func}")
+        return
+
+    yield from visit_external_entity(inferred_node)
+
+    if isinstance(inferred_node, FunctionDef) or isinstance(inferred_node, Lambda):
+        to_type = FunctionEntity
+    elif isinstance(inferred_node, ClassDef):
+        to_type = ClassEntity
+    elif isinstance(inferred_node, Module):
+        to_type = ModuleEntity
+    else:
+        raise ValueError(f"Unknown type {inferred_node}")
+
+    function_qualified_name = function.qname()
+    callee_qualified_name = inferred_node.qname()
+    calls_rel = CallsRel(
+        from_type=FunctionEntity,
+        from_qualified_name=function_qualified_name,
+        to_type=to_type,
+        to_qualified_name=callee_qualified_name,
+        arguments=arguments,
+        lineno=call.lineno,
+    )
+
+    yield calls_rel
+
+    # Lambda function need to be visited
+    if isinstance(inferred_node, Lambda):
+        called_name = inferred_node.name
+
+        lambda_ent = FunctionEntity(
+            name=called_name,
+            qualified_name=callee_qualified_name,
+            file_path=inferred_node.root().file,
+            subtype=FunctionType.LAMBDA,
+        )
 
-            # Function parent
-            contains_rel = ContainsRel(
-                from_type=FunctionEntity,
-                from_qualified_name=function_qualified_name,
-                to_type=FunctionEntity,
-                to_qualified_name=callee_qualified_name,
-            )
-            yield contains_rel
+        yield lambda_ent
+
+        # Function parent
+        contains_rel = ContainsRel(
+            from_type=FunctionEntity,
+            from_qualified_name=function_qualified_name,
+            to_type=FunctionEntity,
+            to_qualified_name=callee_qualified_name,
+        )
+        yield contains_rel
 
 
 def visit_function_return_node(function: FunctionDef):
     """
     Visit body and write down node function returns
     """
-    inferred_nodes = get_inferred_types(lambda: function.infer_call_result(None))
+    inferred_nodes = get_inferred_types(
+        lambda context: function.infer_call_result(None, context), scope=function
+    )
 
     for inferred_node in inferred_nodes:
         yield from visit_external_entity(inferred_node)
@@ -188,7 +236,9 @@ def visit_function_yield_node(function: FunctionDef):
     """
     Visit body and write down node function yields
     """
-    inferred_nodes = get_inferred_types(lambda: function.infer_yield_result(None))
+    inferred_nodes = get_inferred_types(
+        lambda context: function.infer_yield_result(context), scope=function
+    )
 
     for inferred_node in inferred_nodes:
         yield from visit_external_entity(inferred_node)
@@ -215,6 +265,12 @@ def get_function_subtype(function: FunctionDef) -> FunctionType:
         return FunctionType.FUNCTION
 
 
+def get_function_entity_type(function: FunctionDef):
+    if get_function_subtype(function) == FunctionType.FUNCTION:
+        return FunctionEntity
+    return MethodEntity
+
+
 def get_inferred_node_qname(inferred_node):
     if isinstance(inferred_node, LocalsDictNodeNG):
         return inferred_node.qname()
@@ -0,0 +1,92 @@
+from enum import StrEnum
+from typing import Generator, Iterable
+
+from cskg.utils.entity import Entity
+from cskg.utils.graph_component import GraphComponent
+from cskg.utils.mixins import ExternalComponentMixin
+from cskg.utils.relationship import InstantiatesRel, TakesRel
+from cskg.utils.symbols import get_qname_id
+
+# Types referenced by a large share of all parameters and variables
+DEFAULT_HUB_TYPES = (
+    "builtins.Any",
+    "builtins.bool",
+    "builtins.bytes",
+    "builtins.dict",
+    "builtins.float",
+    "builtins.int",
+    "builtins.list",
+    "builtins.set",
+    "builtins.str",
+    "builtins.tuple",
+    "builtins.NoneType",
+)
+
+
+class HubModel(StrEnum):
+    """
+    How references to hub types are modelled.
+
+    - `edges`: TAKES and INSTANTIATES edges, like any other type.
+    - `properties`: parameters of a hub type are listed on their function as
+      `hub_param_names` and `hub_param_types`, and variables of a hub type
+      carry it as `hub_type`. Hub types get no fan-in edges.
+    """
+
+    EDGES = "edges"
+    PROPERTIES = "properties"
+
+
+class HubReferenceFolder:
+    """
+    Folds the TAKES and INSTANTIATES edges of a file that point at hub types
+    into properties of the functions and variables they come from. Functions
+    and variables are visited in the file they are declared in, so the file's
+    components are held back until it is done.
+    """
+
+    def __init__(self, hub_types: Iterable[str] = DEFAULT_HUB_TYPES):
+        self.hub_types = {get_qname_id(hub_type): hub_type for hub_type in hub_types}
+
+    def fold(
+        self, components: Iterable[GraphComponent]
+    ) -> Generator[GraphComponent, None, None]:
+        entities: dict[int, Entity] = {}
+        kept_components = []
+        folded_rels = []
+        for component in components:
+            if isinstance(component, Entity) and not isinstance(
+                component, ExternalComponentMixin
+            ):
+                entities.setdefault(component.qname_id, component)
+            if self.is_hub_reference(component):
+                folded_rels.append(component)
+            else:
+                kept_components.append(component)
+
+        for rel in folded_rels:
+            if isinstance(rel, TakesRel):
+                function = entities.get(rel.from_qname_id)
+                if function is None:
+                    kept_components.append(rel)
+                    continue
+                if not hasattr(function, "hub_param_names"):
+                    function.hub_param_names = []
+                    function.hub_param_types = []
+                function.hub_param_names.append(rel.param_name)
+                function.hub_param_types.append(self.hub_types[rel.to_qname_id])
+            else:
+                variable = entities.get(rel.to_qname_id)
+                if variable is None:
+                    kept_components.append(rel)
+                    continue
+                variable.hub_type = self.hub_types[rel.from_qname_id]
+
+        yield from kept_components
+
+    def is_hub_reference(self, component: GraphComponent) -> bool:
+        if isinstance(component, TakesRel):
+            return component.to_qname_id in self.hub_types
+        if isinstance(component, InstantiatesRel):
+            return component.from_qname_id in self.hub_types
+        return False
@@ -0,0 +1,193 @@
+import heapq
+import sys
+from collections import Counter
+from itertools import islice
+from time import perf_counter
+from typing import Callable
+from astroid import NodeNG
+from astroid.context import InferenceContext, _INFERENCE_CACHE
+from astroid.typing import SuccessfulInferenceResult
+from loguru import logger
+
+
+class InferenceDeadline(list):
+    """
+    Count of the values inferred by a context and its clones, which astroid
+    shares between them as a one item list. Once the deadline has passed, the
+    count reads as over astroid's `max_inferred`, and astroid cuts inference
+    short with `Uninferable` at the next value it infers.
+    """
+
+    def __init__(self, deadline: float):
+        super().__init__([0])
+        self.deadline = deadline
+        self.is_expired = False
+
+    def __getitem__(self, index):
+        if not self.is_expired and perf_counter() > self.deadline:
+            self.is_expired = True
+        if self.is_expired:
+            return sys.maxsize
+        return super().__getitem__(index)
+
+
+class InferenceBudget:
+    """
+    Wall-clock budgets for inference. A single inference call is cut short
+    after `call_budget` seconds, and once a file has spent `file_budget`
+    seconds inferring, the rest of its inference is skipped. Both degrade to
+    the types inferred so far, if any, and the visitors record the others as
+    unknown (`Any`).
+
+    Budgets are enforced cooperatively, between the values astroid infers, so
+    astroid's state stays consistent. A single step of inference that never
+    yields a value is not interrupted.
+
+    Inference time is tallied per file and per function, and the slowest of
+    each are kept for the report.
+    """
+
+    def __init__(
+        self,
+        call_budget: float = None,
+        file_budget: float = None,
+        report_size: int = 20,
+    ):
+        self.call_budget = call_budget
+        self.file_budget = file_budget
+        self.report_size = report_size
+        self.current_file: str = None
+        self.file_time = 0.0
+        self.function_times = Counter()
+        self.slow_files: list[tuple[float, str]] = []
+        self.slow_functions: list[tuple[float, str]] = []
+        self.timeout_count = 0
+        self.skipped_count = 0
+
+    def start_file(self, file_path: str):
+        self.current_file = file_path
+        self.file_time = 0.0
+        self.function_times.clear()
+
+    def end_file(self):
+        self.add_slow_files([(self.file_time, self.current_file)])
+        self.add_slow_functions(
+            [(time, get_qname(frame)) for frame, time in self.function_times.items()]
+        )
+        self.current_file = None
+        self.function_times.clear()
+
+    def run(
+        self,
+        node: NodeNG,
+        infer: Callable[[InferenceContext | None], list[SuccessfulInferenceResult]],
+    ) -> tuple[list[SuccessfulInferenceResult], bool]:
+        """
+        Infer on a context bounded by the budget left, and return the inferred
+        types along with whether inference ran to completion.
+        """
+        timeout = self.get_timeout()
+        if timeout is not None and timeout <= 0:
+            self.skipped_count += 1
+            return [], False
+
+        cache_size = len(_INFERENCE_CACHE)
+        start_time = perf_counter()
+        deadline = None
+        context = None
+        if timeout is not None:
+            deadline = InferenceDeadline(start_time + timeout)
+            context = InferenceContext(nodes_inferred=deadline)
+        try:
+            inferred_types = infer(context)
+        finally:
+            elapsed_time = perf_counter() - start_time
+            self.file_time += elapsed_time
+            self.function_times[get_frame(node)] += elapsed_time
+
+        if deadline is not None and deadline.is_expired:
+            self.timeout_count += 1
+            logger.warning(f"Inference timed out in {get_qname(get_frame(node))}")
+            # astroid memoizes the results it cut short, only those are evicted
+            evict_inferred_since(cache_size)
+            return inferred_types, False
+        return inferred_types, True
+
+    def get_timeout(self) -> float | None:
+        """Time left for the next inference call, `None` if unbounded."""
+        timeouts = []
+        if self.call_budget:
+            timeouts.append(self.call_budget)
+        if self.file_budget:
+            timeouts.append(self.file_budget - self.file_time)
+        return min(timeouts) if timeouts else None
+
+    def add_slow_files(self, slow_files: list[tuple[float, str]]):
+        self.slow_files = heapq.nlargest(self.report_size, self.slow_files + slow_files)
+
+    def add_slow_functions(self, slow_functions: list[tuple[float, str]]):
+        self.slow_functions = heapq.nlargest(
+            self.report_size, self.slow_functions + slow_functions
+        )
+
+    def pop_stats(self) -> dict:
+        stats = {
+            "slow_files": self.slow_files,
+            "slow_functions": self.slow_functions,
+            "timeout_count": self.timeout_count,
+            "skipped_count": self.skipped_count,
+        }
+        self.slow_files, self.slow_functions = [], []
+        self.timeout_count = self.skipped_count = 0
+        return stats
+
+    def add_stats(self, stats: dict):
+        self.add_slow_files(stats["slow_files"])
+        self.add_slow_functions(stats["slow_functions"])
+        self.timeout_count += stats["timeout_count"]
+        self.skipped_count += stats["skipped_count"]
+
+    def report(self):
+        logger.info(
+            f"Inference budget: {self.timeout_count} calls timed out, "
+            f"{self.skipped_count} skipped after file budget"
+        )
+        logger.info("Slowest files by inference time:")
+        for time, file_path in self.slow_files:
+            logger.info(f"  {time:8.2f}s  {file_path}")
+        logger.info("Slowest functions by inference time:")
+        for time, qualified_name in self.slow_functions:
+            logger.info(f"  {time:8.2f}s  {qualified_name}")
+
+
+def evict_inferred_since(cache_size: int):
+    """Drop the entries astroid's inference cache gained past `cache_size`."""
+    new_count = max(len(_INFERENCE_CACHE) - cache_size, 0)
+    for key in list(islice(reversed(_INFERENCE_CACHE), new_count)):
+        del _INFERENCE_CACHE[key]
+
+
+def get_frame(node: NodeNG) -> NodeNG | None:
+    try:
+        return node.frame()
+    except Exception:
+        return None
+
+
+def get_qname(frame: NodeNG | None) -> str:
+    try:
+        return frame.qname()
+    except Exception:
+        return "<unknown>"
+
+
+_inference_budget = InferenceBudget()
+
+
+def get_inference_budget() -> InferenceBudget:
+    return _inference_budget
+
+
+def set_inference_budget(inference_budget: InferenceBudget):
+    global _inference_budget
+    _inference_budget = inference_budget
@@ -1,84 +1,405 @@
 import os
-from glob import glob
-from typing import Generator
+import ast
+import multiprocessing
+from multiprocessing.pool import Pool
+from collections import deque
+from typing import Generator, Iterable
 from astroid import FunctionDef, Module, ClassDef, Lambda
+from astroid.context import _invalidate_cache
+from astroid.inference_tip import clear_inference_tip_cache
+from astroid.nodes._base_nodes import LookupMixIn
 from pymongo.database import Database as MongoDatabase
 from astroid.manager import AstroidManager
 from loguru import logger
-from pymongo.errors import DuplicateKeyError
 from hashlib import md5
 from tqdm import tqdm
 
 from cskg.utils.entity import Entity
+from cskg.utils.mixins import ExternalComponentMixin
+from cskg.utils.relationship import CallSite, CallsRel, Relationship
 from cskg.utils.graph_component import GraphComponent
-from cskg.interpreter.utils import remove_module_prefix
+from cskg.utils.file_hashes import FileHashStore, hash_file
+from cskg.utils.symbols import QnameIdChecker
+from cskg.interpreter.utils import AnalysisLevel, remove_module_prefix
 from cskg.interpreter.nodes import visit_node
+from cskg.interpreter.structure import ModuleStructure, get_module_name
+from cskg.interpreter.classes import clear_abstract_class_cache
+from cskg.interpreter.writer import MongoComponentWriter
+from cskg.interpreter.calls import CallAggregator
+from cskg.interpreter.hubs import DEFAULT_HUB_TYPES, HubModel, HubReferenceFolder
+from cskg.interpreter.inference_budget import InferenceBudget, set_inference_budget
 
 
 class CodeInterpreter:
-    def __init__(self, folder_path, mongo_db: MongoDatabase):
+    def __init__(
+        self,
+        folder_path,
+        mongo_db: MongoDatabase,
+        workers: int = 1,
+        max_resident_modules: int = None,
+        write_batch_size: int = 1000,
+        incremental: bool = False,
+        inference_call_budget: float = None,
+        inference_file_budget: float = None,
+        slow_report_size: int = 20,
+        analysis_level: AnalysisLevel = AnalysisLevel.FULL,
+        aggregate_calls: bool = False,
+        keep_call_sites: bool = False,
+        hub_model: HubModel = HubModel.EDGES,
+        hub_types: Iterable[str] = DEFAULT_HUB_TYPES,
+    ):
         self.folder_path = folder_path
         self.folder_abs_path = os.path.abspath(folder_path)
         self.mongo_db = mongo_db
+        self.workers = workers
+        self.max_resident_modules = max_resident_modules
+        self.resident_modules: deque[str] = deque()
+        self.write_batch_size = write_batch_size
+        self.incremental = incremental
+        self.analysis_level = AnalysisLevel(analysis_level)
+        self.project_modules: set[str] = None
+        self.aggregate_calls = aggregate_calls
+        self.keep_call_sites = keep_call_sites
+        self.hub_model = HubModel(hub_model)
+        self.hub_folder = HubReferenceFolder(hub_types)
+        self.inference_budget = InferenceBudget(
+            call_budget=inference_call_budget,
+            file_budget=inference_file_budget,
+            report_size=slow_report_size,
+        )
+        self.seen_external_entities: set[tuple[str, int]] = set()
+        self.qname_id_checker = QnameIdChecker()
+        self.emitted_count = 0
+        self.duplicate_external_count = 0
         self.manager = AstroidManager()
         self.manager.register_transform(Module, self.format_qname)
         self.manager.register_transform(ClassDef, self.format_qname)
         self.manager.register_transform(FunctionDef, self.format_qname)
         self.manager.register_transform(Lambda, self.format_lambda_name)
 
-        # Drop everything in mongo
-        for collection_name in self.mongo_db.list_collection_names():
-            self.mongo_db.drop_collection(collection_name)
+        # Components may be streamed elsewhere without staging them in mongo
+        self.file_hashes: FileHashStore = None
+        if self.mongo_db is None:
+            return
+
+        # Drop everything in mongo, unless only changed files are reinterpreted
+        if not self.incremental:
+            for collection_name in self.mongo_db.list_collection_names():
+                self.mongo_db.drop_collection(collection_name)
 
         # Create collections
+        collection_names = set(self.mongo_db.list_collection_names())
         for component_class in GraphComponent.visit_subclasses():
             if component_class.type:
                 # Create collection
-                collection = self.mongo_db.create_collection(
-                    component_class.type,
-                    check_exists=False,
-                )
+                if component_class.type not in collection_names:
+                    self.mongo_db.create_collection(
+                        component_class.type,
+                        check_exists=False,
+                    )
+                    collection_names.add(component_class.type)
+                collection = self.mongo_db.get_collection(component_class.type)
 
                 # Create index for entity classes
                 if issubclass(component_class, Entity):
-                    collection.create_index("qualified_name", unique=True)
-
-    def interpret(self):
-        # Insert components into mongo
-        for component in self.visit():
-            try:
-                colection = self.mongo_db.get_collection(component.type)
-                colection.insert_one(component)
+                    collection.create_index("qname_id", unique=True)
+
+                # Components are retracted by file
+                if issubclass(component_class, (Entity, Relationship, CallSite)):
+                    collection.create_index("file_path")
+
+        self.file_hashes = FileHashStore(self.mongo_db)
+
+    def interpret(self, writers: list = None):
+        python_files = self.get_python_files()
+        changed_hashes = self.get_changed_hashes(python_files)
+        changed_files = [
+            file_path for file_path in python_files if file_path in changed_hashes
+        ]
+        logger.info(f"{len(changed_files)} of {len(python_files)} files to interpret")
+
+        # Retract components of modified and deleted files
+        if self.incremental:
+            self.retract_files(list(changed_hashes.keys()))
+
+        # Workers are forked before any writer starts a thread of its own
+        self.prepare_visit()
+        pool = self.create_pool() if self.workers > 1 else None
+
+        # Insert components into mongo, unless other writers are given
+        if writers is None:
+            writers = [
+                MongoComponentWriter(self.mongo_db, batch_size=self.write_batch_size)
+            ]
+        try:
+            for writer in writers:
+                writer.start()
+            for component in self.visit(changed_files, pool):
+                for writer in writers:
+                    writer.write(component)
                 logger.debug(component)
-            except DuplicateKeyError as e:
-                pass
-                
-    def visit(self) -> Generator[GraphComponent, None, None]:
-        python_files = glob(
-            os.path.join(self.folder_abs_path, "**", "*.py"), recursive=True
+        finally:
+            if pool:
+                pool.terminate()
+
+            # Every writer is joined, even when another one fails to close
+            close_errors = []
+            for writer in writers:
+                try:
+                    writer.close()
+                except Exception as e:
+                    close_errors.append(e)
+            if close_errors:
+                raise close_errors[0]
+        for writer in writers:
+            writer.report()
+
+        if self.file_hashes:
+            self.file_hashes.mark_changed(changed_hashes)
+
+    def get_changed_hashes(self, python_files: list[str]) -> dict[str, str | None]:
+        """
+        Compare file contents against the stored hashes. Added and modified
+        files map to their new hash, deleted files map to `None`.
+        """
+        if not self.file_hashes:
+            return dict.fromkeys(python_files)
+        stored_hashes = self.file_hashes.get_hashes()
+        changed_hashes = {}
+        for file_path in python_files:
+            file_hash = hash_file(file_path)
+            if stored_hashes.pop(file_path, None) != file_hash:
+                changed_hashes[file_path] = file_hash
+        for file_path in stored_hashes:
+            changed_hashes[file_path] = None
+        return changed_hashes
+
+    def retract_files(self, file_paths: list[str]):
+        for component_class in GraphComponent.visit_subclasses():
+            if component_class.type and issubclass(
+                component_class, (Entity, Relationship, CallSite)
+            ):
+                collection = self.mongo_db.get_collection(component_class.type)
+                collection.delete_many({"file_path": {"$in": file_paths}})
+
+    def visit(
+        self, python_files: list[str] = None, pool: Pool = None
+    ) -> Generator[GraphComponent, None, None]:
+        if python_files is None:
+            python_files = self.get_python_files()
+
+        # A pool given was forked once the visit was prepared
+        if pool is None:
+            self.prepare_visit()
+        if self.workers > 1:
+            components = self.visit_parallel(python_files, pool)
+        else:
+            components = self.visit_serial(python_files)
+
+        for component in components:
+            if isinstance(component, Entity):
+                self.qname_id_checker.check(
+                    component.qname_id, component.qualified_name
+                )
+            self.emitted_count += 1
+            yield component
+        self.qname_id_checker.clear()
+
+        self.inference_budget.report()
+        self.report_duplicates()
+
+    def visit_serial(
+        self, python_files: list[str]
+    ) -> Generator[GraphComponent, None, None]:
+        bar = tqdm(python_files, desc="Visiting files", unit="files")
+        for file_path in bar:
+            bar.write(f"File: {file_path}")
+            yield from self.visit_file(file_path)
+
+    def prepare_visit(self):
+        if self.analysis_level == AnalysisLevel.STRUCTURE:
+            self.project_modules = self.get_project_modules()
+
+        set_inference_budget(self.inference_budget)
+
+    def create_pool(self) -> Pool:
+        """
+        Fork the worker processes. They inherit the registered astroid
+        transforms and the prepared visit, and are forked before any thread
+        is started, which the children would not inherit in a safe state.
+        """
+        context = multiprocessing.get_context("fork")
+        return context.Pool(self.workers, initializer=_init_worker, initargs=(self,))
+
+    def visit_parallel(
+        self, python_files: list[str], pool: Pool = None
+    ) -> Generator[GraphComponent, None, None]:
+        """
+        Parse and visit files across a pool of worker processes. Workers send
+        back plain component dicts, rebuilt here in file order, along with
+        their statistics. External entities are deduplicated within each
+        worker and again across workers.
+        """
+        if pool is None:
+            with self.create_pool() as pool:
+                yield from self.visit_parallel(python_files, pool)
+            return
+
+        chunksize = max(1, len(python_files) // (self.workers * 16))
+        bar = tqdm(total=len(python_files), desc="Visiting files", unit="files")
+        results = pool.imap(_visit_file, python_files, chunksize=chunksize)
+        for file_path, (components, stats) in zip(python_files, results):
+            self.add_stats(stats)
+            for component in components:
+                component_class = GraphComponent.get_class(component["type"])
+                component = component_class.from_dict(component)
+                if not self.is_duplicate_external_entity(component):
+                    yield component
+            bar.update(1)
+            bar.write(f"File: {file_path}")
+        bar.close()
+
+    def visit_file(self, file_path: str) -> Generator[GraphComponent, None, None]:
+        """
+        Parse a single file and visit it straight away, so its components are
+        flushed before the next file is parsed.
+        """
+        module = self.parse_file(file_path)
+        if not module:
+            return
+
+        if self.analysis_level == AnalysisLevel.STRUCTURE:
+            structure = ModuleStructure(
+                file_path, self.folder_path, self.project_modules
+            )
+            components = structure.visit(module)
+        else:
+            components = visit_node(module, self.analysis_level)
+
+        # References to hub types become properties instead of edges
+        if self.hub_model == HubModel.PROPERTIES:
+            components = self.hub_folder.fold(components)
+
+        # Calls of the file are collapsed into one edge per caller and callee
+        if self.aggregate_calls:
+            call_aggregator = CallAggregator(self.keep_call_sites)
+
+        self.inference_budget.start_file(file_path)
+        for component in components:
+            # Relationships are tagged with their file so they can be retracted
+            if isinstance(component, Relationship):
+                component.file_path = file_path
+                if self.aggregate_calls and isinstance(component, CallsRel):
+                    yield from call_aggregator.add(component)
+                    continue
+            elif self.is_duplicate_external_entity(component):
+                continue
+            yield component
+        self.inference_budget.end_file()
+
+        if self.aggregate_calls:
+            yield from call_aggregator.flush()
+
+        if isinstance(module, Module):
+            self.release_module(module)
+
+    def is_duplicate_external_entity(self, component: GraphComponent) -> bool:
+        """
+        External entities are yielded on every reference, only the first one
+        per type and qualified name ID is kept.
+        """
+        if not isinstance(component, ExternalComponentMixin):
+            return False
+
+        key = (component.type, component.qname_id)
+        if key in self.seen_external_entities:
+            self.duplicate_external_count += 1
+            return True
+
+        self.seen_external_entities.add(key)
+        return False
+
+    def report_duplicates(self):
+        total_count = self.emitted_count + self.duplicate_external_count
+        reduction = self.duplicate_external_count / total_count if total_count else 0
+        logger.info(
+            f"Dropped {self.duplicate_external_count} duplicate external entities, "
+            f"emitted {self.emitted_count} of {total_count} components "
+            f"({reduction:.1%} fewer)"
         )
-        python_files_count = len(python_files)
 
-        modules = []
-        bar = tqdm(total=python_files_count, desc="Parsing files", unit="files")
+    def pop_stats(self) -> dict:
+        """Return and reset the statistics gathered by a worker process."""
+        stats = {
+            "inference_budget": self.inference_budget.pop_stats(),
+            "duplicate_external_count": self.duplicate_external_count,
+        }
+        self.duplicate_external_count = 0
+        return stats
+
+    def add_stats(self, stats: dict):
+        self.inference_budget.add_stats(stats["inference_budget"])
+        self.duplicate_external_count += stats["duplicate_external_count"]
+
+    def release_module(self, module: Module):
+        """
+        Keep at most `max_resident_modules` project modules in the astroid
+        cache. Once the cap is exceeded, all but the most recent half are
+        evicted together with the inference caches that reference them.
+        """
+        if self.max_resident_modules is None:
+            return
+
+        self.resident_modules.append(module.name)
+        if len(self.resident_modules) <= self.max_resident_modules:
+            return
+
+        while len(self.resident_modules) > self.max_resident_modules // 2:
+            self.resident_modules.popleft()
+
+        # Project modules pulled in through imports are evicted as well
+        astroid_cache = self.manager.astroid_cache
+        for name, cached_module in list(astroid_cache.items()):
+            cached_file = cached_module.file
+            if (
+                cached_file
+                and cached_file.startswith(self.folder_abs_path)
+                and name not in self.resident_modules
+            ):
+                del astroid_cache[name]
+
+        clear_abstract_class_cache()
+        clear_inference_tip_cache()
+        _invalidate_cache()
+        LookupMixIn.lookup.cache_clear()
+        logger.debug(f"Evicted modules, {len(astroid_cache)} left in astroid cache")
+
+    def parse_file(self, file_path: str) -> Module | ast.Module | None:
+        logger.debug(f"Ast from file: {file_path}")
+        try:
+            # Structural analysis only needs the stdlib syntax tree
+            if self.analysis_level == AnalysisLevel.STRUCTURE:
+                with open(file_path, "rb") as file:
+                    return ast.parse(file.read(), file_path)
+            return self.manager.ast_from_file(file_path)
+        except Exception as e:
+            logger.error(f"Failed to parse file: {file_path}")
+            logger.error(e)
+            return None
+
+    def get_python_files(self) -> list[str]:
+        python_files = []
         for root, dirs, files in os.walk(self.folder_abs_path):
             for file in files:
                 if str(file).endswith(".py"):  # Only handles python file
-                    file_path = os.path.join(root, file)
-                    logger.debug(f"Ast from file: {file_path}")
-                    try:
-                        module = self.manager.ast_from_file(file_path)
-                        modules.append(module)
-                    except Exception as e:
-                        logger.error(f"Failed to parse file: {file_path}")
-                        logger.error(e)
-                    bar.update(1)
-                    bar.write(f"File: {file_path}")
-        bar.close()
+                    python_files.append(os.path.join(root, file))
+        return python_files
 
-        for module in (bar := tqdm(modules, desc="Visiting nodes", unit="modules")):
-            bar.write(f"Module: {module.name}")
-            yield from visit_node(module)
+    def get_project_modules(self) -> set[str]:
+        return {
+            remove_module_prefix(get_module_name(file_path), self.folder_path)
+            for file_path in self.get_python_files()
+        }
 
     def format_qname(self, node: Module | ClassDef | FunctionDef):
         original_qname_function = node.qname
@@ -100,3 +421,18 @@ class CodeInterpreter:
 
     def get_module_prefix(self):
         return self.folder_abs_path.split("/")[-1]
+
+
+# Interpreter shared with forked worker processes
+_worker_interpreter: CodeInterpreter = None
+
+
+def _init_worker(interpreter: CodeInterpreter):
+    global _worker_interpreter
+    _worker_interpreter = interpreter
+
+
+def _visit_file(file_path: str) -> tuple[list[dict], dict]:
+    components = _worker_interpreter.visit_file(file_path)
+    components = [dict(component) for component in components]
+    return components, _worker_interpreter.pop_stats()
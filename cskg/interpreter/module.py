@@ -1,11 +1,12 @@
 from astroid import Module
 
 from cskg.utils.entity import ModuleEntity
+from cskg.interpreter.utils import AnalysisLevel
 from cskg.interpreter.nodes import visit_children
 from cskg.interpreter.vars import visit_local_variables
 
 
-def visit_module(module: Module):
+def visit_module(module: Module, level: AnalysisLevel = AnalysisLevel.FULL):
     name = get_module_name(module)
     qualified_name = module.qname()
     file_path = module.root().file
@@ -17,8 +18,8 @@ def visit_module(module: Module):
     )
     yield module_ent
 
-    yield from visit_local_variables(module)
-    yield from visit_children(module)
+    yield from visit_local_variables(module, level)
+    yield from visit_children(module, level)
 
 
 def get_module_name(module: Module):
@@ -1,23 +1,25 @@
 import astroid
 
+from cskg.interpreter.utils import AnalysisLevel
 
-def visit_node(node: astroid.NodeNG):
+
+def visit_node(node: astroid.NodeNG, level: AnalysisLevel = AnalysisLevel.FULL):
     if isinstance(node, astroid.Module):
         from cskg.interpreter.module import visit_module
 
-        yield from visit_module(node)
+        yield from visit_module(node, level)
 
     elif isinstance(node, astroid.ClassDef):
         from cskg.interpreter.classes import visit_class
 
-        yield from visit_class(node)
+        yield from visit_class(node, level)
 
     elif isinstance(node, astroid.FunctionDef):
         from cskg.interpreter.functions import visit_function
 
-        yield from visit_function(node)
+        yield from visit_function(node, level)
 
 
-def visit_children(node: astroid.NodeNG):
+def visit_children(node: astroid.NodeNG, level: AnalysisLevel = AnalysisLevel.FULL):
     for child in node.get_children():
-        yield from visit_node(child)
+        yield from visit_node(child, level)
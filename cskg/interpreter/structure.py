@@ -0,0 +1,461 @@
+import ast
+import builtins
+from typing import Generator
+from astroid.modutils import modpath_from_file
+
+from cskg.utils.entity import (
+    ModuleEntity,
+    ClassEntity,
+    FunctionEntity,
+    MethodEntity,
+    VariableEntity,
+    ExternalClassEntity,
+)
+from cskg.utils.graph_component import GraphComponent
+from cskg.utils.relationship import ContainsRel, InheritsRel, TakesRel
+from cskg.interpreter.utils import FunctionType, remove_module_prefix
+from cskg.interpreter.vars import get_variable_access
+
+FunctionNode = ast.FunctionDef | ast.AsyncFunctionDef
+ScopeNode = ast.Module | ast.ClassDef | FunctionNode
+
+# Nodes opening a scope of their own, their bindings are not local
+NESTED_SCOPES = (
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.ClassDef,
+    ast.Lambda,
+    ast.ListComp,
+    ast.SetComp,
+    ast.DictComp,
+    ast.GeneratorExp,
+)
+ABSTRACT_DECORATORS = {"abstractmethod", "abstractproperty"}
+CLASSMETHOD_NAMES = {"__new__", "__init_subclass__", "__class_getitem__"}
+
+
+class ModuleStructure:
+    """
+    Structural pass over a single file with the stdlib `ast`, producing the
+    components of `AnalysisLevel.STRUCTURE` without astroid. Names are
+    resolved syntactically through the module imports and definitions, with
+    the same qualified names astroid would give.
+    """
+
+    def __init__(self, file_path: str, folder_path: str, project_modules: set[str]):
+        self.file_path = file_path
+        self.folder_path = folder_path
+        self.project_modules = project_modules
+        self.module_name = get_module_name(file_path)
+        self.qualified_name = self.format_qname(self.module_name)
+        self.is_package = file_path.endswith("__init__.py")
+        self.symbols: dict[str, str] = {}
+
+    def visit(self, module: ast.Module) -> Generator[GraphComponent, None, None]:
+        self.symbols = self.get_module_symbols(module)
+        yield from self.visit_module(module)
+
+    def visit_children(self, scope: ScopeNode, scope_type: type, scope_qname: str):
+        """
+        Visit the definitions of the scope, the ones directly in modules and
+        classes, or anywhere in a function body outside nested scopes.
+        """
+        if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            nodes = iter_scope_nodes(scope)
+        else:
+            nodes = ast.iter_child_nodes(scope)
+
+        for node in nodes:
+            if isinstance(node, ast.ClassDef):
+                qualified_name = f"{scope_qname}.{node.name}"
+                yield from self.visit_class(
+                    node, qualified_name, scope_type, scope_qname
+                )
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualified_name = f"{scope_qname}.{node.name}"
+                yield from self.visit_function(
+                    node, qualified_name, scope, scope_type, scope_qname
+                )
+
+    def visit_module(self, module: ast.Module):
+        yield ModuleEntity(
+            name=self.qualified_name.split(".").pop(-1),
+            qualified_name=self.qualified_name,
+            file_path=self.file_path,
+        )
+        yield from self.visit_local_variables(module, self.qualified_name)
+        yield from self.visit_children(module, ModuleEntity, self.qualified_name)
+
+    def visit_class(
+        self,
+        cls: ast.ClassDef,
+        qualified_name: str,
+        scope_type: type,
+        scope_qname: str,
+    ):
+        yield ClassEntity(
+            name=cls.name,
+            qualified_name=qualified_name,
+            file_path=self.file_path,
+            is_abstract=self.is_abstract_class(cls),
+        )
+
+        # Classes defined in a function belong to it, others to the module
+        if scope_type in (FunctionEntity, MethodEntity):
+            yield ContainsRel(
+                from_type=scope_type,
+                from_qualified_name=scope_qname,
+                to_type=ClassEntity,
+                to_qualified_name=qualified_name,
+            )
+        else:
+            yield ContainsRel(
+                from_type=ModuleEntity,
+                from_qualified_name=self.qualified_name,
+                to_type=ClassEntity,
+                to_qualified_name=qualified_name,
+            )
+
+        # Classes without bases inherit from object
+        bases = [self.resolve_expression(base) for base in cls.bases]
+        for parent_qualified_name in bases or ["builtins.object"]:
+            yield from self.visit_external_class(parent_qualified_name)
+            yield InheritsRel(
+                from_type=ClassEntity,
+                from_qualified_name=qualified_name,
+                to_type=ClassEntity,
+                to_qualified_name=parent_qualified_name,
+            )  # CHILD -[INHERITS]-> PARENT
+
+        yield from self.visit_children(cls, ClassEntity, qualified_name)
+        yield from self.visit_local_variables(cls, qualified_name)
+
+    def visit_function(
+        self,
+        function: FunctionNode,
+        qualified_name: str,
+        scope: ScopeNode,
+        scope_type: type,
+        scope_qname: str,
+    ):
+        function_subtype = get_function_subtype(function, scope)
+
+        if function_subtype == FunctionType.FUNCTION:
+            function_type = FunctionEntity
+            yield FunctionEntity(
+                name=function.name,
+                qualified_name=qualified_name,
+                file_path=self.file_path,
+                subtype=function_subtype,
+            )
+
+            # Functions defined in a function belong to it, others to the module
+            if scope_type in (FunctionEntity, MethodEntity):
+                yield ContainsRel(
+                    from_type=scope_type,
+                    from_qualified_name=scope_qname,
+                    to_type=FunctionEntity,
+                    to_qualified_name=qualified_name,
+                )
+            else:
+                yield ContainsRel(
+                    from_type=ModuleEntity,
+                    from_qualified_name=self.qualified_name,
+                    to_type=FunctionEntity,
+                    to_qualified_name=qualified_name,
+                )
+
+        else:
+            function_type = MethodEntity
+            yield MethodEntity(
+                name=function.name,
+                qualified_name=qualified_name,
+                file_path=self.file_path,
+                subtype=function_subtype,
+                class_name=scope.name,
+                class_qualified_name=scope_qname,
+                is_abstract=is_abstract_function(function),
+            )
+
+            yield ContainsRel(
+                from_type=ClassEntity,
+                from_qualified_name=scope_qname,
+                to_type=MethodEntity,
+                to_qualified_name=qualified_name,
+            )
+
+        yield from self.visit_local_variables(function, qualified_name)
+        yield from self.visit_parameters(function, qualified_name, function_subtype)
+        yield from self.visit_children(function, function_type, qualified_name)
+
+    def visit_parameters(
+        self,
+        function: FunctionNode,
+        qualified_name: str,
+        function_subtype: FunctionType,
+    ):
+        arguments = function.args
+        is_method = function_subtype in [FunctionType.METHOD, FunctionType.CLASSMETHOD]
+
+        # Defaults belong to the last positional parameters
+        positional = arguments.posonlyargs + arguments.args
+        defaults = [None] * (len(positional) - len(arguments.defaults))
+        defaults += [ast.unparse(default) for default in arguments.defaults]
+        defaults = defaults[len(arguments.posonlyargs) :]
+
+        for index, arg in enumerate(arguments.args):
+            # Skip method self/cls
+            if is_method and index == 0:
+                continue
+
+            if arg.annotation:
+                type_qualified_name = self.resolve_annotation(arg.annotation)
+                yield from self.visit_external_class(type_qualified_name)
+            else:
+                type_qualified_name = "builtins.Any"
+                yield ExternalClassEntity(
+                    name="Any",
+                    qualified_name=type_qualified_name,
+                    file_path=None,
+                )
+
+            yield TakesRel(
+                from_type=FunctionEntity,
+                from_qualified_name=qualified_name,
+                to_type=ClassEntity,
+                to_qualified_name=type_qualified_name,
+                param_name=arg.arg,
+                default_value=defaults[index],
+            )
+
+    def visit_local_variables(self, scope: ScopeNode, qualified_name: str):
+        if isinstance(scope, ast.ClassDef):
+            from_type = ClassEntity
+        elif isinstance(scope, ast.Module):
+            from_type = ModuleEntity
+        else:
+            from_type = FunctionEntity
+
+        for variable_name, is_variable in get_scope_bindings(scope).items():
+            # Only variables
+            if not is_variable:
+                continue
+
+            variable_qualified_name = f"{qualified_name}.{variable_name}"
+            yield VariableEntity(
+                name=variable_name,
+                qualified_name=variable_qualified_name,
+                access=get_variable_access(variable_name),
+                file_path=self.file_path,
+            )
+
+            yield ContainsRel(
+                from_type=from_type,
+                from_qualified_name=qualified_name,
+                to_type=VariableEntity,
+                to_qualified_name=variable_qualified_name,
+            )
+
+    def visit_external_class(self, qualified_name: str):
+        if self.is_internal(qualified_name):
+            return
+
+        yield ExternalClassEntity(
+            name=qualified_name.split(".").pop(-1),
+            qualified_name=qualified_name,
+            file_path=None,
+        )
+
+    def is_abstract_class(self, cls: ast.ClassDef) -> bool:
+        for node in iter_scope_nodes(cls):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if is_abstract_function(node):
+                    return True
+
+        return any(
+            self.resolve_expression(base).split(".").pop(-1) == "ABC"
+            for base in cls.bases
+        )
+
+    def resolve_annotation(self, annotation: ast.expr) -> str:
+        # String annotations are resolved as the expression they hold
+        if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+            try:
+                annotation = ast.parse(annotation.value, mode="eval").body
+            except SyntaxError:
+                return annotation.value
+        return self.resolve_expression(annotation)
+
+    def resolve_expression(self, node: ast.expr) -> str:
+        """Resolve a name, attribute or subscripted reference to a qualified name."""
+        if isinstance(node, ast.Subscript):
+            return self.resolve_expression(node.value)
+
+        attributes = []
+        root = node
+        while isinstance(root, ast.Attribute):
+            attributes.insert(0, root.attr)
+            root = root.value
+        if not isinstance(root, ast.Name):
+            return ast.unparse(node)
+
+        if root.id in self.symbols:
+            root = self.symbols[root.id]
+        elif hasattr(builtins, root.id):
+            root = f"builtins.{root.id}"
+        else:
+            root = root.id
+        return self.format_qname(".".join([root] + attributes))
+
+    def get_module_symbols(self, module: ast.Module) -> dict[str, str]:
+        """Map module level names to what they are bound to."""
+        symbols = {}
+        for node in iter_scope_nodes(module):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        symbols[alias.asname] = alias.name
+                    else:
+                        root = alias.name.split(".")[0]
+                        symbols[root] = root
+            elif isinstance(node, ast.ImportFrom):
+                from_module = self.resolve_import_from(node)
+                for alias in node.names:
+                    symbols[alias.asname or alias.name] = f"{from_module}.{alias.name}"
+            elif isinstance(
+                node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+            ):
+                symbols.setdefault(node.name, f"{self.module_name}.{node.name}")
+        return symbols
+
+    def resolve_import_from(self, node: ast.ImportFrom) -> str:
+        if not node.level:
+            return node.module
+
+        # Relative imports start from the package of this module
+        package = self.module_name.split(".")
+        if not self.is_package:
+            package = package[:-1]
+        if node.level > 1:
+            package = package[: -(node.level - 1)]
+        return ".".join(package + ([node.module] if node.module else []))
+
+    def is_internal(self, qualified_name: str) -> bool:
+        parts = qualified_name.split(".")
+        return any(
+            ".".join(parts[:index]) in self.project_modules
+            for index in range(1, len(parts))
+        )
+
+    def format_qname(self, qualified_name: str) -> str:
+        return remove_module_prefix(qualified_name, self.folder_path)
+
+
+def get_module_name(file_path: str) -> str:
+    """Module name as astroid derives it when parsing the file."""
+    try:
+        module_name = ".".join(modpath_from_file(file_path))
+    except ImportError:
+        return file_path
+
+    # Packages are named after their directory
+    return module_name.removesuffix(".__init__")
+
+
+def get_function_subtype(function: FunctionNode, scope: ScopeNode) -> FunctionType:
+    if not isinstance(scope, ast.ClassDef):
+        return FunctionType.FUNCTION
+
+    decorator_names = {get_decorator_name(node) for node in function.decorator_list}
+    if "staticmethod" in decorator_names:
+        return FunctionType.STATICMETHOD
+    if "classmethod" in decorator_names or function.name in CLASSMETHOD_NAMES:
+        return FunctionType.CLASSMETHOD
+    return FunctionType.METHOD
+
+
+def is_abstract_function(function: FunctionNode) -> bool:
+    """Mirror astroid's check, a lone `pass` or `raise NotImplementedError` counts."""
+    decorator_names = {get_decorator_name(node) for node in function.decorator_list}
+    if decorator_names & ABSTRACT_DECORATORS:
+        return True
+
+    body = function.body
+    if (
+        body
+        and isinstance(body[0], ast.Expr)
+        and isinstance(body[0].value, ast.Constant)
+    ):
+        if isinstance(body[0].value.value, str):
+            body = body[1:]  # Skip docstring
+    if not body:
+        return True
+
+    statement = body[0]
+    if isinstance(statement, ast.Raise) and statement.exc is not None:
+        exception = statement.exc
+        if isinstance(exception, ast.Call):
+            exception = exception.func
+        return isinstance(exception, ast.Name) and exception.id == "NotImplementedError"
+    return isinstance(statement, ast.Pass)
+
+
+def get_decorator_name(node: ast.expr) -> str | None:
+    if isinstance(node, ast.Call):
+        node = node.func
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+def get_scope_bindings(scope: ScopeNode) -> dict[str, bool]:
+    """
+    Names bound in the scope, in source order, mapped to whether their first
+    binding is a plain variable rather than an import, class or function.
+    """
+    bindings = {}
+    if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        arguments = scope.args
+        for arg in arguments.posonlyargs + arguments.args:
+            bindings.setdefault(arg.arg, True)
+        if arguments.vararg:
+            bindings.setdefault(arguments.vararg.arg, True)
+        for arg in arguments.kwonlyargs:
+            bindings.setdefault(arg.arg, True)
+        if arguments.kwarg:
+            bindings.setdefault(arguments.kwarg.arg, True)
+
+    declared = set()
+    for node in iter_scope_nodes(scope):
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            declared.update(node.names)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            bindings.setdefault(node.id, True)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bindings.setdefault(node.name, True)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            bindings.setdefault(node.name, True)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                name = alias.asname or alias.name.split(".")[0]
+                bindings.setdefault(name, False)
+        elif isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            bindings.setdefault(node.name, False)
+
+    return {
+        name: is_variable
+        for name, is_variable in bindings.items()
+        if name not in declared
+    }
+
+
+def iter_scope_nodes(scope: ScopeNode) -> Generator[ast.AST, None, None]:
+    """Nodes of the scope body in source order, without entering nested scopes."""
+    stack = list(reversed(scope.body))
+    while stack:
+        node = stack.pop()
+        yield node
+        if not isinstance(node, NESTED_SCOPES):
+            stack.extend(reversed(list(ast.iter_child_nodes(node))))
@@ -1,11 +1,13 @@
 from enum import StrEnum
 from typing import Callable, overload
 from astroid import NodeNG, InferenceError, Module, ClassDef, FunctionDef
+from astroid.context import InferenceContext
 from astroid.typing import SuccessfulInferenceResult, InferenceResult
 from astroid.util import Uninferable
 from astroid.bases import Proxy
 from loguru import logger
 
+from cskg.interpreter.inference_budget import get_inference_budget
 from cskg.utils.entity import (
     ExternalModuleEntity,
     ExternalClassEntity,
@@ -19,30 +21,50 @@ def get_module_prefix(folder_path: str):
 
 
 def remove_module_prefix(qualified_name: str, folder_path: str):
-    module_prefix = get_module_prefix(folder_path)
+    # Only a leading prefix is removed, the same parts may recur in the name
+    module_prefix = get_module_prefix(folder_path) + "."
     if qualified_name.startswith(module_prefix):
-        return qualified_name.replace(module_prefix + ".", "")
+        return qualified_name.removeprefix(module_prefix)
     return qualified_name
 
 
 @overload
-def get_inferred_types(node: NodeNG) -> list[SuccessfulInferenceResult]: ...
+def get_inferred_types(
+    node: NodeNG, scope: NodeNG = None
+) -> list[SuccessfulInferenceResult]: ...
 
 
 @overload
 def get_inferred_types(
-    lambda_x: Callable[[], list[InferenceResult]]
+    lambda_x: Callable[[InferenceContext | None], list[InferenceResult]],
+    scope: NodeNG = None,
 ) -> list[SuccessfulInferenceResult]: ...
 
 
 def get_inferred_types(
-    node_or_lambda: NodeNG | Callable[[], list[InferenceResult]],
+    node_or_lambda: NodeNG | Callable[[InferenceContext | None], list[InferenceResult]],
+    scope: NodeNG = None,
+) -> list[SuccessfulInferenceResult]:
+    if isinstance(node_or_lambda, NodeNG) and scope is None:
+        scope = node_or_lambda
+
+    # Inference time is budgeted and attributed to the enclosing function
+    inference_budget = get_inference_budget()
+    inferred_types, is_complete = inference_budget.run(
+        scope, lambda context: infer_types(node_or_lambda, context)
+    )
+    return inferred_types
+
+
+def infer_types(
+    node_or_lambda: NodeNG | Callable[[InferenceContext | None], list[InferenceResult]],
+    context: InferenceContext = None,
 ) -> list[SuccessfulInferenceResult]:
     try:
         if isinstance(node_or_lambda, NodeNG):
-            inferred_types = node_or_lambda.inferred()
+            inferred_types = node_or_lambda.infer(context)
         else:
-            inferred_types = node_or_lambda()
+            inferred_types = node_or_lambda(context)
 
         inferred_types = filter(lambda node: node is not Uninferable, inferred_types)
         inferred_types = list(inferred_types)
@@ -80,6 +102,39 @@ def get_inferred_type(
     return None
 
 
+class AnalysisLevel(StrEnum):
+    """
+    How deep the interpreter analyses the code. Each level produces what the
+    previous one does, plus:
+
+    - `structure`: module, class, function, method and variable entities,
+      CONTAINS, INHERITS with bases resolved through the module imports, and
+      TAKES to the annotation as written. Files are parsed with the stdlib
+      `ast`, nothing is inferred.
+    - `resolved`: astroid resolution of bases and annotations, and CALLS to
+      inferred callees with untyped (`Any`) arguments.
+    - `full`: argument types on CALLS, RETURNS, YIELDS and INSTANTIATES from
+      full inference.
+
+    Without inference, the `structure` level names some targets differently
+    from the astroid levels:
+
+    - Names are resolved through the imports as written, so a re-exported
+      class keeps the name it is imported under (`tqdm.tqdm`), where astroid
+      gives the module defining it (`tqdm.std.tqdm`).
+    - Builtins are named after the `builtins` module (`builtins.type`), and
+      classes without bases inherit from `builtins.object`. Bases astroid adds
+      on its own, such as `builtins.NoneType` for enums, are missing.
+    - Enum members are plain class variables, astroid turns them into
+      instances and leaves them out.
+    - Lambdas are only entities once CALLS reach them, so there are none.
+    """
+
+    STRUCTURE = "structure"
+    RESOLVED = "resolved"
+    FULL = "full"
+
+
 class FunctionType(StrEnum):
     FUNCTION = "function"
     METHOD = "method"
@@ -10,10 +10,16 @@ from loguru import logger
 
 from cskg.utils.entity import VariableEntity, ClassEntity, FunctionEntity, ModuleEntity
 from cskg.utils.relationship import ContainsRel, InstantiatesRel
-from cskg.interpreter.utils import get_inferred_type, visit_external_entity
+from cskg.interpreter.utils import (
+    AnalysisLevel,
+    get_inferred_type,
+    visit_external_entity,
+)
 
 
-def visit_local_variables(node: LocalsDictNodeNG):
+def visit_local_variables(
+    node: LocalsDictNodeNG, level: AnalysisLevel = AnalysisLevel.FULL
+):
     qname = node.qname()
     file_path = node.root().file
 
@@ -38,6 +44,9 @@ def visit_local_variables(node: LocalsDictNodeNG):
         # Containment relationships
         yield from get_contains_rel(node, var_qname)
 
+        if level != AnalysisLevel.FULL:
+            continue
+
         # Variable instantiate from class
         inferred_type = get_variable_inferred_type(var_assign_name)
         yield from visit_external_entity(inferred_type)
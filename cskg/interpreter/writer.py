@@ -0,0 +1,129 @@
+from collections import Counter, defaultdict
+from queue import Queue
+from threading import Thread
+from loguru import logger
+from pymongo import UpdateOne
+from pymongo.database import Database as MongoDatabase
+from pymongo.errors import BulkWriteError
+
+from cskg.utils.entity import Entity
+from cskg.utils.graph_component import GraphComponent
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class MongoComponentWriter:
+    """
+    Buffers components per collection and flushes them with unordered bulk
+    writes on a background thread. Entities are upserted on their qualified
+    name ID so duplicates are counted instead of raising, relationships are
+    inserted as they are.
+    """
+
+    def __init__(
+        self, mongo_db: MongoDatabase, batch_size: int = 1000, queue_size: int = 10000
+    ):
+        self.mongo_db = mongo_db
+        self.batch_size = batch_size
+        self.queue: Queue[GraphComponent | None] = Queue(maxsize=queue_size)
+        self.entity_buffers: dict[str, dict[int, dict]] = defaultdict(dict)
+        self.relationship_buffers: dict[str, list[dict]] = defaultdict(list)
+        self.inserted_counts = Counter()
+        self.duplicate_counts = Counter()
+        self.error: Exception = None
+        self.thread = Thread(target=self.run, name="mongo-writer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def write(self, component: GraphComponent):
+        if self.error:
+            raise self.error
+        self.queue.put(component)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def run(self):
+        component = ...
+        try:
+            while (component := self.queue.get()) is not None:
+                self.buffer(component)
+            self.flush_all()
+        except Exception as e:
+            self.error = e
+            # Keep draining so producers never block on a dead writer, unless
+            # the end of the stream has been taken off the queue already
+            while component is not None:
+                component = self.queue.get()
+
+    def buffer(self, component: GraphComponent):
+        collection_name = component.type
+        document = dict(component)
+
+        if isinstance(component, Entity):
+            buffer = self.entity_buffers[collection_name]
+            if component.qname_id in buffer:
+                self.duplicate_counts[collection_name] += 1
+                return
+            buffer[component.qname_id] = document
+        else:
+            buffer = self.relationship_buffers[collection_name]
+            buffer.append(document)
+
+        if len(buffer) >= self.batch_size:
+            self.flush(collection_name)
+
+    def flush_all(self):
+        for collection_name in list(self.entity_buffers.keys()):
+            self.flush(collection_name)
+        for collection_name in list(self.relationship_buffers.keys()):
+            self.flush(collection_name)
+
+    def flush(self, collection_name: str):
+        collection = self.mongo_db.get_collection(collection_name)
+
+        if collection_name in self.entity_buffers:
+            documents = self.entity_buffers.pop(collection_name)
+            if not documents:
+                return
+            operations = [
+                UpdateOne(
+                    {"qname_id": qname_id},
+                    {"$setOnInsert": document},
+                    upsert=True,
+                )
+                for qname_id, document in documents.items()
+            ]
+            try:
+                result = collection.bulk_write(operations, ordered=False)
+                inserted_count = result.upserted_count
+            except BulkWriteError as e:
+                # Racing upserts on the same key surface as duplicate key errors
+                errors = e.details["writeErrors"]
+                if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+                    raise
+                inserted_count = e.details["nUpserted"]
+            self.inserted_counts[collection_name] += inserted_count
+            self.duplicate_counts[collection_name] += len(operations) - inserted_count
+
+        elif collection_name in self.relationship_buffers:
+            documents = self.relationship_buffers.pop(collection_name)
+            if not documents:
+                return
+            collection.insert_many(documents, ordered=False)
+            self.inserted_counts[collection_name] += len(documents)
+
+    def report(self):
+        for collection_name in sorted(self.inserted_counts | self.duplicate_counts):
+            logger.info(
+                f"{collection_name}: {self.inserted_counts[collection_name]} inserted, "
+                f"{self.duplicate_counts[collection_name]} duplicates"
+            )
+        logger.info(
+            f"Total: {self.inserted_counts.total()} inserted, "
+            f"{self.duplicate_counts.total()} duplicates"
+        )
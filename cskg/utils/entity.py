@@ -2,12 +2,15 @@ from abc import ABC
 
 from cskg.utils.graph_component import GraphComponent
 from cskg.utils.mixins import ExternalComponentMixin
+from cskg.utils.symbols import get_qname_id
 
 
 class Entity(GraphComponent, ABC):
     def __init__(self, name: str, qualified_name: str, **kwargs):
         self.name: str
         self.qualified_name: str
+        self.qname_id: int
+        kwargs.setdefault("qname_id", get_qname_id(qualified_name))
         super().__init__(name=name, qualified_name=qualified_name, **kwargs)
 
 
@@ -0,0 +1,60 @@
+from hashlib import md5
+from pymongo import UpdateOne
+from pymongo.database import Database as MongoDatabase
+
+
+class FileHashStore:
+    """
+    Content hashes of interpreted files, kept next to the staged components.
+
+    Files whose components changed since the graph was last composed are
+    flagged `pending`; deleted files keep a `None` hash until the composer
+    has retracted them.
+    """
+
+    collection_name = "file_hashes"
+
+    def __init__(self, mongo_db: MongoDatabase):
+        self.collection = mongo_db.get_collection(self.collection_name)
+        self.collection.create_index("file_path", unique=True)
+        self.collection.create_index("pending")
+
+    def get_hashes(self) -> dict[str, str]:
+        documents = self.collection.find(
+            {"hash": {"$ne": None}}, {"_id": False, "file_path": True, "hash": True}
+        )
+        return {document["file_path"]: document["hash"] for document in documents}
+
+    def mark_changed(self, hashes: dict[str, str | None]):
+        if not hashes:
+            return
+        operations = [
+            UpdateOne(
+                {"file_path": file_path},
+                {"$set": {"hash": file_hash, "pending": True}},
+                upsert=True,
+            )
+            for file_path, file_hash in hashes.items()
+        ]
+        self.collection.bulk_write(operations, ordered=False)
+
+    def get_pending(self) -> tuple[list[str], list[str]]:
+        """Return pending file paths, split into (changed, deleted)."""
+        changed, deleted = [], []
+        for document in self.collection.find({"pending": True}):
+            if document["hash"] is None:
+                deleted.append(document["file_path"])
+            else:
+                changed.append(document["file_path"])
+        return changed, deleted
+
+    def acknowledge(self, file_paths: list[str]):
+        self.collection.delete_many({"file_path": {"$in": file_paths}, "hash": None})
+        self.collection.update_many(
+            {"file_path": {"$in": file_paths}}, {"$set": {"pending": False}}
+        )
+
+
+def hash_file(file_path: str) -> str:
+    with open(file_path, "rb") as file:
+        return md5(file.read()).hexdigest()
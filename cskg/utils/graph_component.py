@@ -32,6 +32,7 @@ class GraphComponent(
     dict, ABC, VisitSubclassesMixin, CreateInstanceMixin, metaclass=GraphComponentMeta
 ):
     __final_fields__: list[str] = ["type", "label", "extra_labels"]
+    __transient_fields__: list[str] = []
 
     type: str = None
     label: str = None
@@ -44,7 +45,8 @@ class GraphComponent(
 
         for key, value in kwargs.items():
             super().__setattr__(key, value)
-            super().__setitem__(key, self.encode_dict_value(value))
+            if key not in self.__transient_fields__:
+                super().__setitem__(key, self.encode_dict_value(value))
 
     @classmethod
     def get_class(cls, type: str) -> Self:
@@ -76,7 +78,10 @@ class GraphComponent(
             raise ValueError(f"Not allowed to set attribute {__name}")
 
         super().__setattr__(__name, __value)
-        super().__setitem__(__name, self.encode_dict_value(__value))
+
+        # Transient fields are kept on the instance, but never stored
+        if __name not in self.__transient_fields__:
+            super().__setitem__(__name, self.encode_dict_value(__value))
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} {super().__repr__()}>"
@@ -3,9 +3,13 @@ from typing import Type
 
 from cskg.utils.entity import Entity
 from cskg.utils.graph_component import GraphComponent
+from cskg.utils.symbols import get_qname_id
 
 
 class Relationship(GraphComponent, ABC):
+    # Endpoints are stored by ID, their names are kept on the entities
+    __transient_fields__ = ["from_qualified_name", "to_qualified_name"]
+
     def __init__(
         self,
         from_type: Type[Entity],
@@ -16,8 +20,14 @@ class Relationship(GraphComponent, ABC):
     ):
         self.from_type: Type[Entity]
         self.from_qualified_name: str
+        self.from_qname_id: int
         self.to_type: Type[Entity]
         self.to_qualified_name: str
+        self.to_qname_id: int
+        if from_qualified_name is not None:
+            kwargs.setdefault("from_qname_id", get_qname_id(from_qualified_name))
+        if to_qualified_name is not None:
+            kwargs.setdefault("to_qname_id", get_qname_id(to_qualified_name))
         super().__init__(
             from_type=from_type,
             from_qualified_name=from_qualified_name,
@@ -28,6 +38,8 @@ class Relationship(GraphComponent, ABC):
 
     @classmethod
     def from_dict(cls, dict):
+        # Stored relationships only know their endpoints by ID
+        dict = {"from_qualified_name": None, "to_qualified_name": None, **dict}
         instance = super().from_dict(dict)
 
         from_type_str = instance.from_type
@@ -42,10 +54,23 @@ class Relationship(GraphComponent, ABC):
 
 
 class CallsRel(Relationship):
+    # Call sites are only known while their file is visited
+    __transient_fields__ = Relationship.__transient_fields__ + ["lineno"]
+
     type = "calls_rel"
     label = "CALLS"
 
 
+class CallSite(GraphComponent):
+    """
+    A single call site of an aggregated CALLS edge. Kept in its own
+    collection on the side, and never composed into the graph.
+    """
+
+    type = "call_site"
+    label = "CallSite"
+
+
 class InheritsRel(Relationship):
     type = "inherits_rel"
     label = "INHERITS"
@@ -0,0 +1,37 @@
+from hashlib import blake2b
+from zlib import crc32
+
+
+def get_qname_id(qualified_name: str) -> int:
+    """
+    Stable 63-bit ID of a qualified name, which fits a signed 64-bit int. IDs
+    are derived from the name alone, so worker processes and runs agree on
+    them without sharing any state.
+    """
+    digest = blake2b(qualified_name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest) >> 1
+
+
+class QnameIdCollision(ValueError):
+    """Raised when two qualified names hash to the same ID."""
+
+
+class QnameIdChecker:
+    """
+    Checks, over one run, that no two qualified names share an ID, which would
+    merge their entities in storage. Only a 32-bit checksum of each name is
+    kept, rather than the name itself.
+    """
+
+    def __init__(self):
+        self.checksums: dict[int, int] = {}
+
+    def check(self, qname_id: int, qualified_name: str):
+        checksum = crc32(qualified_name.encode())
+        if self.checksums.setdefault(qname_id, checksum) != checksum:
+            raise QnameIdCollision(
+                f"Qualified name {qualified_name} collides on ID {qname_id}"
+            )
+
+    def clear(self):
+        self.checksums.clear()
@@ -0,0 +1,123 @@
+from pathlib import Path
+from threading import Thread
+from typing import Callable
+
+from astroid.manager import AstroidManager
+import pytest
+
+
+def close_in_thread(writer, timeout: float = 5.0) -> list[Exception]:
+    """Close a writer, failing instead of hanging when it never returns."""
+    errors = []
+
+    def close():
+        try:
+            writer.close()
+        except Exception as e:
+            errors.append(e)
+
+    thread = Thread(target=close, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "close() did not return"
+    return errors
+
+
+class FakeRecord(list):
+    def values(self) -> list:
+        return list(self)
+
+
+class FakeSession:
+    """Runs every query, managed or not, through the database's responder."""
+
+    def __init__(self, neo_db: "FakeNeoDatabase"):
+        self.neo_db = neo_db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def run(self, query: str, params: dict = None):
+        return iter(map(FakeRecord, self.neo_db.respond(query, params)))
+
+    def execute_write(self, work: Callable, *args):
+        return work(self, *args)
+
+    execute_read = execute_write
+
+
+class FakeNeoDatabase:
+    """
+    Stands in for the neomodel database and its driver. Queries are recorded,
+    and answered with the rows `responder(query, params)` returns.
+    """
+
+    _database_name = None
+
+    def __init__(self, responder: Callable[[str, dict], list] = None):
+        self.responder = responder or (lambda query, params: [])
+        self.queries: list[tuple[str, dict]] = []
+        self.session_configs: list[dict] = []
+        self.driver = self
+
+    def session(self, **config) -> FakeSession:
+        self.session_configs.append(config)
+        return FakeSession(self)
+
+    def respond(self, query: str, params: dict = None) -> list:
+        self.queries.append((" ".join(query.split()), params))
+        return self.responder(query, params)
+
+    def cypher_query(self, query: str, params: dict = None):
+        return self.respond(query, params), None
+
+
+@pytest.fixture
+def make_fake_neo_db() -> type[FakeNeoDatabase]:
+    """Build fake databases answering with a responder of their own."""
+    return FakeNeoDatabase
+
+
+@pytest.fixture
+def fake_neo_db(make_fake_neo_db) -> FakeNeoDatabase:
+    return make_fake_neo_db()
+
+
+@pytest.fixture
+def close_writer() -> Callable[..., list[Exception]]:
+    return close_in_thread
+
+
+@pytest.fixture
+def make_package(tmp_path: Path, monkeypatch) -> Callable[[dict[str, str]], str]:
+    """
+    Write the files of a `pkg` package and return its folder path the way the
+    interpreter is pointed at one, under a parent folder on sys.path. The
+    astroid transforms registered and the modules parsed meanwhile are dropped
+    afterwards.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    manager = AstroidManager()
+    transforms = {
+        key: list(value) for key, value in manager._transform.transforms.items()
+    }
+
+    def make_package(files: dict[str, str]) -> str:
+        package_path = tmp_path / "target" / "pkg"
+        package_path.mkdir(parents=True, exist_ok=True)
+        (package_path / "__init__.py").write_text("")
+        for file_name, code in files.items():
+            (package_path / file_name).write_text(code)
+        return "target/pkg"
+
+    yield make_package
+
+    manager._transform.transforms.clear()
+    manager._transform.transforms.update(transforms)
+    for module_name in list(manager.astroid_cache):
+        if module_name.split(".")[0] in ("target", "pkg"):
+            del manager.astroid_cache[module_name]
@@ -0,0 +1,69 @@
+import pytest
+
+from cskg.interpreter.interpreter import CodeInterpreter
+from cskg.interpreter.utils import AnalysisLevel, remove_module_prefix
+from tests.test_interpreter import PACKAGE
+from tests.test_nodes import CODE
+
+
+def visit(folder_path, analysis_level: AnalysisLevel) -> list[dict]:
+    interpreter = CodeInterpreter(folder_path, None, analysis_level=analysis_level)
+    return [dict(component) for component in interpreter.visit()]
+
+
+def get_structure(components: list[dict]) -> set[tuple]:
+    """Project entities and what contains them."""
+    return {
+        (
+            c["type"],
+            c.get("qualified_name"),
+            c.get("from_qname_id"),
+            c.get("to_qname_id"),
+        )
+        for c in components
+        if c["type"] in ("contains_rel", "takes_rel")
+        or c["type"].endswith("_ent")
+        and not c["type"].startswith("external_")
+    }
+
+
+def get_types(components: list[dict]) -> set[str]:
+    return {component["type"] for component in components}
+
+
+@pytest.fixture
+def folder_path(make_package):
+    return make_package({**PACKAGE, "nested.py": CODE})
+
+
+def test_every_level_finds_the_same_structure(folder_path):
+    structures = [
+        get_structure(visit(folder_path, analysis_level))
+        for analysis_level in AnalysisLevel
+    ]
+
+    assert structures[0]
+    assert all(structure == structures[0] for structure in structures)
+
+
+def test_levels_add_calls_then_inferred_types(folder_path):
+    structure_types = get_types(visit(folder_path, AnalysisLevel.STRUCTURE))
+    resolved_components = visit(folder_path, AnalysisLevel.RESOLVED)
+    full_types = get_types(visit(folder_path, AnalysisLevel.FULL))
+
+    assert "calls_rel" not in structure_types
+    assert "calls_rel" in get_types(resolved_components)
+    assert "returns_rel" not in get_types(resolved_components)
+    assert {"calls_rel", "returns_rel"} <= full_types
+    assert all(
+        set(c["arguments"]) <= {"Any"}
+        for c in resolved_components
+        if c["type"] == "calls_rel"
+    )
+
+
+def test_module_prefix_is_only_removed_from_the_start():
+    assert remove_module_prefix("target.pkg.m", "target/pkg") == "pkg.m"
+    assert remove_module_prefix("target.pkg.target.m", "target/pkg") == "pkg.target.m"
+    assert remove_module_prefix("builtins.type", "target/pkg") == "builtins.type"
+    assert remove_module_prefix("builtins.type", "pkg") == "builtins.type"
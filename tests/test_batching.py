@@ -0,0 +1,64 @@
+import mongomock
+import pytest
+
+from cskg.composer.batching import AdaptiveBatcher, BatchTooLarge
+from cskg.composer.composer import ComposeMode, GraphComposer
+
+
+def test_batches_are_capped_by_rows_and_bytes():
+    components = [{"name": "x" * 100} for _ in range(10)]
+
+    batcher = AdaptiveBatcher("rows", initial_size=4)
+    assert [len(batch) for batch in batcher.batches(components)] == [4, 4, 2]
+
+    batcher = AdaptiveBatcher("bytes", initial_size=100, target_bytes=250)
+    assert [len(batch) for batch in batcher.batches(components)] == [2] * 5
+
+
+def test_size_follows_the_write_latency():
+    batcher = AdaptiveBatcher("latency", initial_size=1000, target_latency=2.0)
+
+    batcher.record(1000, 0.5)
+    assert batcher.size == 1500
+
+    batcher.record(1500, 6.0)
+    assert batcher.size == 500
+
+    batcher.back_off(500)
+    assert batcher.size == 250
+    batcher.back_off(150)
+    assert batcher.size == batcher.min_size
+    assert batcher.back_off_count == 2
+
+
+def test_batches_too_large_are_split(fake_neo_db):
+    composer = GraphComposer(
+        mongomock.MongoClient().db, fake_neo_db, mode=ComposeMode.BULK_IMPORT
+    )
+    batcher = composer.get_batcher("split")
+    written_batches = []
+
+    def write(cypher, params):
+        if len(params["entities"]) > 2:
+            raise BatchTooLarge("MemoryLimit")
+        written_batches.append(params["entities"])
+        return params["entities"]
+
+    params = {"entities": [1, 2, 3, 4, 5], "run_id": "run"}
+    results = composer.write_batch(write, "cypher", params, batcher)
+
+    assert results == [1, 2, 3, 4, 5]
+    assert written_batches == [[1, 2], [3], [4, 5]]
+    assert batcher.back_off_count == 2
+
+
+def test_single_rows_too_large_are_raised(fake_neo_db):
+    composer = GraphComposer(
+        mongomock.MongoClient().db, fake_neo_db, mode=ComposeMode.BULK_IMPORT
+    )
+
+    def write(cypher, params):
+        raise BatchTooLarge("MemoryLimit")
+
+    with pytest.raises(BatchTooLarge):
+        composer.write_batch(write, "cypher", {"entities": [1]}, AdaptiveBatcher("one"))
@@ -0,0 +1,86 @@
+import csv
+import os
+
+import mongomock
+
+from cskg.composer import bulk_import
+from cskg.composer.bulk_import import BulkImportExporter, format_value, get_id_space
+from cskg.composer.graph_schema import GraphSchema
+from cskg.utils.entity import FunctionEntity, MethodEntity
+from cskg.utils.relationship import CallsRel
+
+
+def read_csv(path: str) -> list[list[str]]:
+    with open(path, newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_methods_share_the_function_id_space():
+    assert get_id_space(MethodEntity) == get_id_space(FunctionEntity) == "Function"
+
+
+def test_values_are_formatted_for_neo4j_admin():
+    assert format_value(None) == ""
+    assert format_value(True) == "true"
+    assert format_value(["a", "b"]) == "a;b"
+    assert format_value(1) == 1
+
+
+def get_field_types(collection, excluded_fields) -> list[tuple[str, str]]:
+    """Mongomock has no `$type` aggregation operator, fields are typed here."""
+    field_types = {}
+    for document in collection.find():
+        for field, value in document.items():
+            if field not in excluded_fields and value is not None:
+                field_types[field] = "long" if isinstance(value, int) else "string"
+    return sorted(field_types.items())
+
+
+def test_export_drops_duplicates_and_dangling_relationships(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_import, "get_field_types", get_field_types)
+    mongo_db = mongomock.MongoClient().db
+    functions = [
+        FunctionEntity(name=name, qualified_name=f"pkg.{name}", file_path="pkg.py")
+        for name in ("f", "g", "f")
+    ]
+    mongo_db.get_collection(FunctionEntity.type).insert_many(map(dict, functions))
+    calls = [
+        CallsRel(
+            from_type=FunctionEntity,
+            from_qualified_name="pkg.f",
+            to_type=FunctionEntity,
+            to_qualified_name=to_qualified_name,
+            arguments=["int"],
+        )
+        for to_qualified_name in ("pkg.g", "pkg.missing")
+    ]
+    mongo_db.get_collection(CallsRel.type).insert_many(map(dict, calls))
+
+    exporter = BulkImportExporter(mongo_db, str(tmp_path), compress=False)
+    exporter.export()
+
+    nodes_path = os.path.join(tmp_path, "nodes", FunctionEntity.type)
+    (node_header,) = read_csv(f"{nodes_path}.header.csv")
+    assert node_header[:2] == ["qname_id:ID(Function)", ":LABEL"]
+    assert len(read_csv(f"{nodes_path}.csv")) == 2
+    assert exporter.duplicate_count == 1
+
+    (relationships_path,) = [
+        data_path for header_path, data_path in exporter.relationship_files
+    ]
+    ((from_id, to_id, label, *_),) = read_csv(relationships_path)
+    assert (int(from_id), int(to_id), label) == (
+        functions[0].qname_id,
+        functions[1].qname_id,
+        "CALLS",
+    )
+    assert exporter.dropped_count == 1
+
+    # The import creates no schema, it is left to a script run afterwards
+    with open(exporter.get_schema_path()) as schema_file:
+        schema_queries = schema_file.read().splitlines()
+    assert (
+        "CREATE CONSTRAINT Function_identity IF NOT EXISTS "
+        "FOR (n:Function) REQUIRE (n.qname_id, n.type) IS UNIQUE;"
+    ) in schema_queries
+    assert len(schema_queries) == len(GraphSchema(None).plan())
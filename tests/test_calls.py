@@ -0,0 +1,32 @@
+from cskg.interpreter.calls import CallAggregator
+from cskg.utils.entity import FunctionEntity
+from cskg.utils.relationship import CallsRel
+from cskg.utils.symbols import get_qname_id
+
+
+def get_calls_rel(arguments: list[str]) -> CallsRel:
+    return CallsRel(
+        from_type=FunctionEntity,
+        from_qualified_name="pkg.caller",
+        to_type=FunctionEntity,
+        to_qualified_name="pkg.callee",
+        file_path="pkg.py",
+        lineno=1,
+        arguments=arguments,
+    )
+
+
+def test_call_aggregator_collapses_call_sites():
+    aggregator = CallAggregator(keep_call_sites=True)
+    call_sites = [
+        *aggregator.add(get_calls_rel(["int"])),
+        *aggregator.add(get_calls_rel(["str"])),
+        *aggregator.add(get_calls_rel(["int"])),
+    ]
+    (calls_rel,) = aggregator.flush()
+
+    assert len(call_sites) == 3
+    assert calls_rel["call_count"] == 3
+    assert calls_rel["argument_signatures"] == ["int", "str"]
+    assert calls_rel.from_qualified_name == "pkg.caller"
+    assert calls_rel["to_qname_id"] == get_qname_id("pkg.callee")
@@ -0,0 +1,189 @@
+from itertools import product
+
+import mongomock
+import pytest
+
+from cskg.composer.batching import split_params
+from cskg.composer.composer import (
+    ComposeMode,
+    GraphComposer,
+    get_bucket_filter,
+    get_bucket_schedule,
+    get_relationship_key,
+)
+from cskg.utils.entity import ExternalFunctionEntity, FunctionEntity
+from cskg.utils.relationship import CallsRel
+
+
+@pytest.mark.parametrize("worker_count", [1, 2, 3, 4, 7])
+def test_bucket_schedule_visits_every_pair_once(worker_count):
+    bucket_count = 2 * worker_count
+    schedule = get_bucket_schedule(worker_count)
+
+    bucket_pairs = [
+        bucket_pair
+        for bucket_round in schedule
+        for task in bucket_round
+        for bucket_pair in task
+    ]
+    assert sorted(bucket_pairs) == list(product(range(bucket_count), repeat=2))
+
+
+@pytest.mark.parametrize("worker_count", [2, 3, 4, 7])
+def test_bucket_schedule_rounds_share_no_bucket(worker_count):
+    for bucket_round in get_bucket_schedule(worker_count):
+        assert len(bucket_round) == worker_count
+        task_buckets = [
+            {bucket for bucket_pair in task for bucket in bucket_pair}
+            for task in bucket_round
+        ]
+        all_buckets = set().union(*task_buckets)
+        assert len(all_buckets) == sum(map(len, task_buckets))
+
+
+def test_bucket_filter_matches_both_endpoints():
+    assert get_bucket_filter(4, 1, 3) == {
+        "from_qname_id": {"$mod": [4, 1]},
+        "to_qname_id": {"$mod": [4, 3]},
+    }
+
+
+def test_split_params_keeps_the_other_parameters():
+    params = {"relationships": [1, 2, 3], "run_id": "run"}
+    first_params, second_params = split_params(params)
+
+    assert first_params == {"relationships": [1], "run_id": "run"}
+    assert second_params == {"relationships": [2, 3], "run_id": "run"}
+
+
+def test_upserts_take_the_run_as_a_parameter(fake_neo_db):
+    mongo_db = mongomock.MongoClient().db
+    mongo_db.get_collection(FunctionEntity.type).insert_one(
+        dict(FunctionEntity(name="f", qualified_name="pkg.f", file_path="pkg.py"))
+    )
+    composer = GraphComposer(mongo_db, fake_neo_db, mode=ComposeMode.UPSERT)
+
+    ((query, params, *_),) = composer.visit_entities(entity_classes=[FunctionEntity])
+
+    assert "$run_id" in query and composer.run_id not in query
+    assert params["run_id"] == composer.run_id
+
+
+def test_incremental_composition_only_adds_referenced_externals(fake_neo_db):
+    mongo_db = mongomock.MongoClient().db
+    externals = [
+        ExternalFunctionEntity(name=name, qualified_name=f"lib.{name}", file_path=None)
+        for name in ("used", "unused")
+    ]
+    mongo_db.get_collection(ExternalFunctionEntity.type).insert_many(
+        [dict(external) for external in externals]
+    )
+    mongo_db.get_collection(CallsRel.type).insert_one(
+        dict(
+            CallsRel(
+                from_type=FunctionEntity,
+                from_qualified_name="pkg.f",
+                to_type=ExternalFunctionEntity,
+                to_qualified_name="lib.used",
+                file_path="pkg.py",
+            )
+        )
+    )
+    composer = GraphComposer(mongo_db, fake_neo_db, mode=ComposeMode.INCREMENTAL)
+
+    entity_filter, external_filter, _ = composer.get_change_filters(
+        ["pkg.py"], ["pkg.py"], []
+    )
+    ((query, params, *_),) = composer.visit_entities(
+        entity_filter, [ExternalFunctionEntity], external_filter=external_filter
+    )
+
+    assert "MERGE" in query
+    assert [entity["qualified_name"] for entity in params["entities"]] == ["lib.used"]
+
+
+def test_relationship_rows_pair_node_ids_and_drop_dangling_ones(make_fake_neo_db):
+    fake_neo_db = make_fake_neo_db(
+        lambda query, params: [
+            [qname_id, 100 + qname_id]
+            for qname_id in (params or {}).get("qname_ids", [])
+            if qname_id == 2
+        ]
+    )
+    composer = GraphComposer(
+        mongomock.MongoClient().db, fake_neo_db, mode=ComposeMode.INCREMENTAL
+    )
+    composer.add_node_ids(["Function"], [(1, 11)])
+    relationships = [
+        {"from_qname_id": 1, "to_qname_id": 2},
+        {"from_qname_id": 1, "to_qname_id": 3},
+    ]
+
+    rows = composer.get_relationship_rows(relationships, "Function", "Function")
+
+    assert rows == [{"from_id": 11, "to_id": 102, "properties": relationships[0]}]
+    assert composer.dropped_count == 1
+    # Node IDs looked up in the graph are kept for the next batches
+    assert composer.node_ids["Function"][2] == 102
+
+
+def test_relationship_keys_follow_the_site_identity():
+    relationship = {
+        "from_qname_id": 1,
+        "to_qname_id": 2,
+        "file_path": "pkg.py",
+        "param_name": "a",
+    }
+    key = get_relationship_key("takes_rel", relationship, 0)
+
+    assert key == get_relationship_key(
+        "takes_rel", {**relationship, "param_name": "b"}, 0
+    )
+    assert key != get_relationship_key("takes_rel", relationship, 1)
+    assert key != get_relationship_key("calls_rel", relationship, 0)
+    assert key != get_relationship_key(
+        "takes_rel", {**relationship, "file_path": "other.py"}, 0
+    )
+
+
+def get_relationship_rows(fake_neo_db, mode: ComposeMode) -> list[dict]:
+    """Rows composed for two identical call sites of a file."""
+    mongo_db = mongomock.MongoClient().db
+    calls_rel = CallsRel(
+        from_type=FunctionEntity,
+        from_qualified_name="pkg.caller",
+        to_type=FunctionEntity,
+        to_qualified_name="pkg.callee",
+        file_path="pkg.py",
+        lineno=1,
+        arguments=["builtins.int"],
+    )
+    mongo_db.get_collection(CallsRel.type).insert_many(
+        [dict(calls_rel), dict(calls_rel)]
+    )
+    composer = GraphComposer(mongo_db, fake_neo_db, mode=mode)
+    composer.add_node_ids(
+        [FunctionEntity.label],
+        [(calls_rel.from_qname_id, 1), (calls_rel.to_qname_id, 2)],
+    )
+
+    return [
+        row
+        for query, params, *_ in composer.visit_relationships()
+        for row in params["relationships"]
+    ]
+
+
+def test_upsert_and_rebuild_compose_as_many_edges(fake_neo_db, monkeypatch):
+    monkeypatch.setattr(
+        "cskg.composer.composer.clear_neo4j_database", lambda *args, **kwargs: None
+    )
+    rebuild_rows = get_relationship_rows(fake_neo_db, ComposeMode.REBUILD)
+    upsert_rows = get_relationship_rows(fake_neo_db, ComposeMode.UPSERT)
+
+    assert len(rebuild_rows) == 2
+    assert len({row["key"] for row in upsert_rows}) == 2
+    # The same sites are merged into the same edges on the next run
+    assert [row["key"] for row in upsert_rows] == [
+        row["key"] for row in get_relationship_rows(fake_neo_db, ComposeMode.UPSERT)
+    ]
@@ -0,0 +1,83 @@
+import time
+
+import mongomock
+import pytest
+
+from cskg.detectors.data_clumps import DataClumpsDetector, FpGrowthEngine
+from cskg.detectors.detector import AbstractDetector
+from cskg.driver import Driver
+
+
+@pytest.mark.parametrize("detector_class", list(AbstractDetector.visit_subclasses()))
+def test_detectors_take_fetch_size_by_keyword(detector_class, fake_neo_db):
+    detector = detector_class.create_instance(None, fake_neo_db, fetch_size=10)
+    detector.open_session()
+
+    assert detector.fetch_size == 10
+    assert fake_neo_db.session_configs == [{"database": None, "fetch_size": 10}]
+
+
+def test_data_clumps_forwards_fetch_size_with_engine(fake_neo_db):
+    detector = DataClumpsDetector(
+        None, fake_neo_db, engine=FpGrowthEngine.GRAPH, fetch_size=10
+    )
+
+    assert detector.mutates_graph
+    assert detector.fetch_size == 10
+
+
+class FailingDetector(AbstractDetector):
+    result_collection_name = "failing"
+
+    def detect(self):
+        raise RuntimeError("detection failed")
+
+
+def test_failed_detection_is_timed_and_reported(monkeypatch, fake_neo_db):
+    monkeypatch.setattr(Driver, "__del__", lambda self: None)
+    monkeypatch.setattr(AbstractDetector, "visit_subclasses", lambda: [FailingDetector])
+    driver = Driver.__new__(Driver)
+    driver.code_smells_db = mongomock.MongoClient().db
+    driver.neo_db = fake_neo_db
+    driver.fetch_size = 10
+    driver.detect_workers = 1
+    reports = []
+    driver.report_detection = lambda *args: reports.append(args)
+
+    with pytest.raises(RuntimeError, match="detection failed"):
+        driver.detect_smells()
+
+    ((detectors, elapsed_time),) = reports
+    assert detectors[0].elapsed_time > 0
+    assert elapsed_time >= detectors[0].elapsed_time
+    del driver
+
+
+class SleepingDetector(AbstractDetector):
+    result_collection_name = "sleeping"
+    running = []
+    overlaps = []
+
+    def detect(self):
+        if self.mutates_graph:
+            self.overlaps.append(any(d.mutates_graph for d in self.running))
+        self.running.append(self)
+        time.sleep(0.05)
+        self.running.remove(self)
+
+
+def test_mutating_detectors_never_run_alongside_one_another(monkeypatch, fake_neo_db):
+    monkeypatch.setattr(Driver, "__del__", lambda self: None)
+    driver = Driver.__new__(Driver)
+    driver.detect_workers = 4
+    detectors = [
+        SleepingDetector(mongomock.MongoClient().db, fake_neo_db) for _ in range(6)
+    ]
+    for detector in detectors[:3]:
+        detector.mutates_graph = True
+
+    driver.detect_in_parallel(detectors)
+
+    assert SleepingDetector.overlaps == [False] * 3
+    assert all(detector.elapsed_time > 0 for detector in detectors)
+    del driver
@@ -0,0 +1,41 @@
+import os
+
+import mongomock
+
+from cskg.interpreter.interpreter import CodeInterpreter
+from cskg.utils.file_hashes import FileHashStore, hash_file
+
+
+def test_pending_files_are_split_and_acknowledged():
+    file_hashes = FileHashStore(mongomock.MongoClient().db)
+    file_hashes.mark_changed({"a.py": "1", "b.py": "2"})
+    file_hashes.acknowledge(["a.py", "b.py"])
+    file_hashes.mark_changed({"a.py": "3", "b.py": None})
+
+    assert file_hashes.get_pending() == (["a.py"], ["b.py"])
+
+    file_hashes.acknowledge(["a.py", "b.py"])
+    assert file_hashes.get_pending() == ([], [])
+    assert file_hashes.get_hashes() == {"a.py": "3"}
+
+
+def test_only_added_modified_and_deleted_files_are_changed(make_package):
+    folder_path = make_package({"kept.py": "", "modified.py": "", "deleted.py": ""})
+    interpreter = CodeInterpreter(folder_path, None)
+    interpreter.file_hashes = FileHashStore(mongomock.MongoClient().db)
+    python_files = {
+        file_path.rsplit("/", 1)[-1]: file_path
+        for file_path in interpreter.get_python_files()
+    }
+    interpreter.file_hashes.mark_changed(
+        {file_path: hash_file(file_path) for file_path in python_files.values()}
+    )
+
+    make_package({"modified.py": "x = 1\n", "added.py": ""})
+    os.remove(python_files["deleted.py"])
+    changed_hashes = interpreter.get_changed_hashes(interpreter.get_python_files())
+
+    assert {
+        file_path.rsplit("/", 1)[-1]: file_hash is not None
+        for file_path, file_hash in changed_hashes.items()
+    } == {"modified.py": True, "added.py": True, "deleted.py": False}
@@ -0,0 +1,43 @@
+import mongomock
+
+from cskg.detectors.data_clumps import DataClumpsDetector
+from cskg.detectors.fp_growth import FpTree
+
+
+def test_itemsets_are_mined_with_their_support():
+    fp_tree = FpTree()
+    for transaction in ([0, 1, 2], [0, 1, 2], [0, 1, 2, 3], [0, 3]):
+        fp_tree.insert(transaction)
+
+    assert sorted(fp_tree.mine(2)) == [([2, 0, 1], 3)]
+    # Item 3 ends a path of support 1 and a path too short to be a clump
+    assert list(fp_tree.mine(3)) == []
+    assert list(fp_tree.mine(3, min_support=1)) == [([3, 0, 1, 2], 1), ([3, 1, 2], 1)]
+
+
+def test_data_clumps_are_found_in_memory(make_fake_neo_db):
+    clump = [("pkg.A", "a"), ("pkg.B", "b"), ("pkg.C", "c")]
+    functions = [clump, clump + [("pkg.D", "d")], clump, [("pkg.A", "a")]]
+    fake_neo_db = make_fake_neo_db(
+        lambda query, params: [
+            [
+                [type for type, name in function],
+                [name for type, name in function],
+                f"pkg/m{index % 2}.py",
+            ]
+            for index, function in enumerate(functions)
+        ]
+    )
+    mongo_db = mongomock.MongoClient().db
+
+    DataClumpsDetector(mongo_db, fake_neo_db).run()
+
+    findings = list(mongo_db.data_clumps.find({}, {"_id": False}))
+    assert findings == [
+        {
+            "itemset": [["pkg.C", "c"], ["pkg.A", "a"], ["pkg.B", "b"]],
+            "support_count": 3,
+            "size": 3,
+            "file_paths": ["pkg/m0.py", "pkg/m1.py"],
+        }
+    ]
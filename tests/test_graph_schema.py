@@ -0,0 +1,34 @@
+from cskg.composer.graph_schema import GraphSchema
+from cskg.utils.entity import Entity
+from cskg.utils.relationship import Relationship
+
+
+def test_schema_is_planned_once_per_label(fake_neo_db):
+    labels = {entity_class.label for entity_class in Entity.visit_subclasses()}
+    relationship_labels = {
+        relationship_class.label
+        for relationship_class in Relationship.visit_subclasses()
+    }
+    names = [name for name, query in GraphSchema(fake_neo_db).plan()]
+
+    assert len(names) == len(set(names))
+    assert len(names) == 4 * len(labels) + len(relationship_labels)
+    assert {f"{label}_identity" for label in labels} <= set(names)
+    assert {f"{label}_file_path" for label in relationship_labels} <= set(names)
+
+
+def test_indexes_are_awaited_once_after_creation(fake_neo_db):
+    graph_schema = GraphSchema(fake_neo_db, await_timeout=5)
+    graph_schema.create()
+    graph_schema.await_online()
+    graph_schema.await_online()
+
+    queries = [query for query, params in fake_neo_db.queries]
+    assert len(queries) == len(graph_schema.plan()) + 2
+    assert queries.count("CALL db.awaitIndexes($timeout)") == 1
+
+    graph_schema.create()
+    graph_schema.await_online()
+    assert [query for query, params in fake_neo_db.queries].count(
+        "CALL db.awaitIndexes($timeout)"
+    ) == 2
@@ -0,0 +1,48 @@
+from cskg.interpreter.hubs import HubReferenceFolder
+from cskg.utils.entity import ClassEntity, FunctionEntity, VariableEntity
+from cskg.utils.relationship import InstantiatesRel, TakesRel
+
+
+def get_takes_rel(from_qualified_name, to_qualified_name, param_name):
+    return TakesRel(
+        from_type=FunctionEntity,
+        from_qualified_name=from_qualified_name,
+        to_type=ClassEntity,
+        to_qualified_name=to_qualified_name,
+        param_name=param_name,
+    )
+
+
+def test_hub_references_are_folded_into_properties():
+    function = FunctionEntity(name="f", qualified_name="pkg.f", file_path="pkg.py")
+    variable = VariableEntity(name="x", qualified_name="pkg.f.x", file_path="pkg.py")
+    components = [
+        function,
+        variable,
+        get_takes_rel("pkg.f", "builtins.int", "a"),
+        get_takes_rel("pkg.f", "pkg.Config", "config"),
+        InstantiatesRel(
+            from_type=ClassEntity,
+            from_qualified_name="builtins.str",
+            to_type=VariableEntity,
+            to_qualified_name="pkg.f.x",
+        ),
+    ]
+
+    kept_components = list(HubReferenceFolder().fold(components))
+
+    assert [c.type for c in kept_components] == [
+        function.type,
+        variable.type,
+        TakesRel.type,
+    ]
+    assert kept_components[2].to_qualified_name == "pkg.Config"
+    assert function.hub_param_names == ["a"]
+    assert function.hub_param_types == ["builtins.int"]
+    assert variable.hub_type == "builtins.str"
+
+
+def test_references_from_other_files_are_kept():
+    takes_rel = get_takes_rel("pkg.other.f", "builtins.int", "a")
+
+    assert list(HubReferenceFolder().fold([takes_rel])) == [takes_rel]
@@ -0,0 +1,61 @@
+import astroid
+from astroid.context import InferenceContext, _INFERENCE_CACHE
+from astroid.util import Uninferable
+
+from cskg.interpreter.inference_budget import InferenceBudget, InferenceDeadline
+from cskg.interpreter.utils import infer_types
+
+
+def get_node():
+    return astroid.extract_node("def f():\n    return 1\nf()  #@\n")
+
+
+def test_unbounded_inference_runs_to_completion():
+    node = get_node()
+    inference_budget = InferenceBudget()
+    inferred_types, is_complete = inference_budget.run(
+        node, lambda context: infer_types(node, context)
+    )
+    assert [inferred.value for inferred in inferred_types] == [1]
+    assert is_complete
+
+
+def test_expired_deadline_cuts_inference_short():
+    node = get_node()
+    context = InferenceContext(nodes_inferred=InferenceDeadline(0.0))
+    assert list(node.infer(context)) == [Uninferable]
+
+
+def test_timed_out_inference_is_reported_incomplete():
+    node = get_node()
+    inference_budget = InferenceBudget(call_budget=1e-9)
+    inferred_types, is_complete = inference_budget.run(
+        node, lambda context: infer_types(node, context)
+    )
+    assert inferred_types == []
+    assert not is_complete
+    assert inference_budget.timeout_count == 1
+
+
+def test_timed_out_inference_only_evicts_its_own_results():
+    node = get_node()
+    _INFERENCE_CACHE["kept"] = (1,)
+
+    def infer(context):
+        _INFERENCE_CACHE["cut_short"] = (Uninferable,)
+        return infer_types(node, context)
+
+    try:
+        InferenceBudget(call_budget=1e-9).run(node, infer)
+        assert "kept" in _INFERENCE_CACHE
+        assert "cut_short" not in _INFERENCE_CACHE
+    finally:
+        _INFERENCE_CACHE.pop("kept", None)
+
+
+def test_spent_file_budget_skips_inference():
+    inference_budget = InferenceBudget(file_budget=1.0)
+    inference_budget.file_time = 1.0
+    inferred_types, is_complete = inference_budget.run(get_node(), lambda context: [1])
+    assert (inferred_types, is_complete) == ([], False)
+    assert inference_budget.skipped_count == 1
@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+from cskg.interpreter.interpreter import CodeInterpreter
+from cskg.utils.mixins import ExternalComponentMixin
+
+
+class RecordingWriter:
+    def __init__(self, close_error: Exception = None):
+        self.close_error = close_error
+        self.components = []
+        self.is_closed = False
+
+    def start(self): ...
+
+    def write(self, component):
+        self.components.append(component)
+
+    def close(self):
+        self.is_closed = True
+        if self.close_error:
+            raise self.close_error
+
+    def report(self): ...
+
+
+def interpret(folder_path, writers: list, **options):
+    interpreter = CodeInterpreter(folder_path, None, **options)
+    interpreter.interpret(writers)
+
+
+def test_every_writer_is_closed_when_one_fails(make_package):
+    folder_path = make_package({"m.py": "def f(a, b):\n    return a\n"})
+
+    failing_writer = RecordingWriter(RuntimeError("close failed"))
+    writer = RecordingWriter()
+    with pytest.raises(RuntimeError, match="close failed"):
+        interpret(folder_path, [failing_writer, writer])
+
+    assert failing_writer.is_closed and writer.is_closed
+    assert writer.components == failing_writer.components != []
+
+
+PACKAGE = {
+    "base.py": (
+        "from typing import Any\n\n\n"
+        "class Base:\n"
+        "    def log(self, message: Any):\n"
+        "        print(message)\n"
+    ),
+    "child.py": (
+        "from pkg.base import Base\n\n\n"
+        "class Child(Base):\n"
+        "    def run(self, count: int):\n"
+        "        self.log(str(count))\n"
+        "        return len([count])\n"
+    ),
+    "helpers.py": "def helper(a, b):\n    return max(a, b)\n",
+}
+
+
+def visit(folder_path, **options) -> list[str]:
+    interpreter = CodeInterpreter(folder_path, None, **options)
+    components = [
+        json.dumps(component, sort_keys=True) for component in interpreter.visit()
+    ]
+    return sorted(components)
+
+
+def test_parallel_visit_matches_serial(make_package):
+    folder_path = make_package(PACKAGE)
+    serial_components = visit(folder_path)
+
+    assert serial_components
+    assert visit(folder_path, workers=2) == serial_components
+
+
+def test_workers_are_forked_before_writers_start(make_package, monkeypatch):
+    folder_path = make_package(PACKAGE)
+    events = []
+    create_pool = CodeInterpreter.create_pool
+
+    def record_pool(interpreter):
+        events.append("pool")
+        return create_pool(interpreter)
+
+    monkeypatch.setattr(CodeInterpreter, "create_pool", record_pool)
+    writer = RecordingWriter()
+    writer.start = lambda: events.append("start")
+    interpret(folder_path, [writer], workers=2)
+
+    assert events == ["pool", "start"]
+    assert writer.components
+
+
+def test_module_cap_evicts_without_changing_output(make_package):
+    folder_path = make_package(PACKAGE)
+    components = visit(folder_path)
+
+    interpreter = CodeInterpreter(folder_path, None, max_resident_modules=2)
+    capped_components = [json.dumps(c, sort_keys=True) for c in interpreter.visit()]
+    resident_files = [
+        module.file
+        for module in interpreter.manager.astroid_cache.values()
+        if module.file and module.file.startswith(interpreter.folder_abs_path)
+    ]
+
+    assert sorted(capped_components) == components
+    assert len(resident_files) <= 2
+
+
+def test_external_entities_are_emitted_once(make_package):
+    folder_path = make_package(PACKAGE)
+    interpreter = CodeInterpreter(folder_path, None)
+    external_keys = [
+        (component.type, component.qname_id)
+        for component in interpreter.visit()
+        if isinstance(component, ExternalComponentMixin)
+    ]
+
+    assert len(external_keys) == len(set(external_keys))
+    assert interpreter.duplicate_external_count > 0
+
+
+def test_calls_are_aggregated_per_caller_and_callee(make_package):
+    folder_path = make_package(
+        {"m.py": "def f(a):\n    print(a)\n    print(1)\n    print(a, a)\n"}
+    )
+    interpreter = CodeInterpreter(
+        folder_path, None, aggregate_calls=True, keep_call_sites=True
+    )
+    components = [dict(component) for component in interpreter.visit()]
+
+    (calls_rel,) = [c for c in components if c["type"] == "calls_rel"]
+    call_sites = [c for c in components if c["type"] == "call_site"]
+    assert calls_rel["call_count"] == 3
+    assert calls_rel["argument_signatures"] == ["Any", "Any, Any"]
+    assert sorted(c["lineno"] for c in call_sites) == [2, 3, 4]
@@ -0,0 +1,127 @@
+import astroid
+
+from cskg.interpreter.classes import clear_abstract_class_cache, inherits_abc
+from cskg.interpreter.nodes import visit_node
+
+CODE = """
+import os
+
+
+def outer(x):
+    def inner(y):
+        return os.path.join(y, "a")
+
+    class Local:
+        def method(self):
+            return len("x")
+
+    return inner(x)
+
+
+if os.name == "nt":
+    def windows_only():
+        pass
+
+
+class Outer:
+    class Inner:
+        def deep(self):
+            return outer(1)
+"""
+
+
+def visit(code):
+    module = astroid.parse(code, module_name="m", path="m.py")
+    return list(visit_node(module))
+
+
+def test_definitions_in_functions_are_contained_by_them():
+    components = visit(CODE)
+    entities = {
+        c["qualified_name"]
+        for c in components
+        if c["type"] in ("module_ent", "class_ent", "function_ent", "method_ent")
+    }
+    contains = {
+        (c.from_qualified_name, c.to_qualified_name)
+        for c in components
+        if c["type"] == "contains_rel"
+    }
+
+    assert {
+        "m",
+        "m.outer",
+        "m.outer.inner",
+        "m.outer.Local",
+        "m.outer.Local.method",
+        "m.Outer",
+        "m.Outer.Inner",
+        "m.Outer.Inner.deep",
+    } <= entities
+    assert "m.windows_only" not in entities
+    assert {
+        ("m.outer", "m.outer.inner"),
+        ("m.outer", "m.outer.Local"),
+        ("m.outer.Local", "m.outer.Local.method"),
+    } <= contains
+
+
+def test_calls_belong_to_their_innermost_function():
+    components = visit(CODE)
+    calls = {
+        (c.from_qualified_name, c.to_qualified_name)
+        for c in components
+        if c["type"] == "calls_rel"
+    }
+
+    # os.path is posixpath or ntpath depending on the platform
+    callers = {callee.split(".").pop(-1): caller for caller, callee in calls}
+    assert len(calls) == 4
+    assert callers == {
+        "inner": "m.outer",
+        "join": "m.outer.inner",
+        "len": "m.outer.Local.method",
+        "outer": "m.Outer.Inner.deep",
+    }
+
+
+def test_components_keep_the_scope_order():
+    components = visit("""
+class C:
+    x = 1
+
+    def method(self, y):
+        return len(y)
+""")
+    order = [
+        (c["type"], c.get("qualified_name") or c.to_qualified_name) for c in components
+    ]
+
+    # Calls come before the function variables, class children before its own
+    assert order.index(("calls_rel", "builtins.len")) < order.index(
+        ("variable_ent", "m.C.method.y")
+    )
+    assert order.index(("method_ent", "m.C.method")) < order.index(
+        ("variable_ent", "m.C.x")
+    )
+
+
+class FakeClass:
+    def __init__(self, name, *bases):
+        self.name = name
+        self.bases = list(bases)
+
+    def ancestors(self, recurs=True):
+        return iter(self.bases)
+
+
+def test_inherits_abc_memo_is_not_poisoned_by_cycles():
+    clear_abstract_class_cache()
+    a, b = FakeClass("A"), FakeClass("B")
+    a.bases = [b, FakeClass("ABC")]
+    b.bases = [a]
+
+    # B is reached through A while A is still being walked
+    assert inherits_abc(a)
+    assert inherits_abc(b)
+    clear_abstract_class_cache()
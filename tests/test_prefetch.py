@@ -0,0 +1,35 @@
+import pytest
+
+from cskg.composer.prefetch import Prefetcher
+
+
+def test_items_are_prefetched_in_order():
+    assert list(Prefetcher(lambda: range(10), size=2)) == list(range(10))
+
+
+def test_producer_errors_reach_the_consumer():
+    def visit_items():
+        yield 1
+        raise RuntimeError("read failed")
+
+    items = []
+    with pytest.raises(RuntimeError, match="read failed"):
+        for item in Prefetcher(visit_items):
+            items.append(item)
+    assert items == [1]
+
+
+def test_stopping_early_closes_the_producer():
+    closed = []
+
+    def visit_items():
+        try:
+            yield from range(100)
+        finally:
+            closed.append(True)
+
+    for item in Prefetcher(visit_items, size=1):
+        if item == 3:
+            break
+
+    assert closed == [True]
@@ -0,0 +1,72 @@
+from time import time
+
+import mongomock
+import pytest
+
+from cskg.detectors.detector import AbstractDetector
+from cskg.detectors.result_sink import ResultSink
+
+
+class FindingsDetector(AbstractDetector):
+    result_collection_name = "findings"
+    result_indexes = ("name",)
+
+    def __init__(self, *args, error: BaseException = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.error = error
+
+    def detect(self):
+        self.result_sink.add({"name": "finding"})
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def mongo_db():
+    return mongomock.MongoClient().db
+
+
+def test_commit_replaces_the_findings(mongo_db):
+    mongo_db.findings.insert_one({"name": "stale"})
+    sink = ResultSink(mongo_db, "findings", ("name",), batch_size=2)
+    sink.open()
+    for index in range(3):
+        sink.add({"name": f"finding {index}"})
+    sink.commit()
+
+    assert mongo_db.list_collection_names() == ["findings"]
+    assert mongo_db.findings.count_documents({}) == sink.inserted_count == 3
+    assert "name_1" in mongo_db.findings.index_information()
+
+
+def test_open_drops_stale_staging_collections(mongo_db):
+    now = int(time())
+    mongo_db.create_collection("findings.staging.dead")
+    mongo_db.create_collection(f"findings.staging.{now - 7200}.dead")
+    mongo_db.create_collection(f"findings.staging.{now}.concurrent")
+    mongo_db.create_collection("other.staging.alive")
+    sink = ResultSink(mongo_db, "findings", stale_after=3600)
+    sink.open()
+
+    assert sorted(mongo_db.list_collection_names()) == sorted(
+        [
+            sink.staging_collection.name,
+            f"findings.staging.{now}.concurrent",
+            "other.staging.alive",
+        ]
+    )
+
+
+def test_collection_name_is_required(mongo_db):
+    with pytest.raises(ValueError):
+        ResultSink(mongo_db, None)
+
+
+@pytest.mark.parametrize("error", [RuntimeError(), KeyboardInterrupt()])
+def test_failed_run_keeps_the_last_findings(mongo_db, fake_neo_db, error):
+    FindingsDetector(mongo_db, fake_neo_db).run()
+    with pytest.raises(type(error)):
+        FindingsDetector(mongo_db, fake_neo_db, error=error).run()
+
+    assert mongo_db.list_collection_names() == ["findings"]
+    assert mongo_db.findings.count_documents({}) == 1
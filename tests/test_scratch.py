@@ -0,0 +1,41 @@
+from cskg.detectors.scratch import ScratchWorkspace, get_scratch_label
+
+
+def test_scratch_labels_are_namespaced():
+    assert get_scratch_label("DataClumps") == "Scratch_DataClumps"
+    assert get_scratch_label("DataClumps", "Item") == "Scratch_DataClumps_Item"
+    assert ScratchWorkspace("DataClumps", None).get_label("Item") == (
+        "Scratch_DataClumps_Item"
+    )
+
+
+def test_clear_only_touches_scratch_nodes_and_indexes():
+    queries = []
+
+    def cypher_query(query, params=None):
+        queries.append((" ".join(query.split()), params))
+        if "SHOW INDEXES" in query:
+            return [["Scratch_DataClumps_item"]]
+        return []
+
+    workspace = ScratchWorkspace("DataClumps", cypher_query)
+    workspace.create_index("item", ["param_name", "support_count"])
+    workspace.clear()
+
+    assert queries == [
+        (
+            "CREATE INDEX Scratch_DataClumps_item IF NOT EXISTS "
+            "FOR (n:Scratch_DataClumps) ON (n.param_name, n.support_count)",
+            None,
+        ),
+        (
+            "MATCH (n:Scratch_DataClumps) CALL { WITH n DETACH DELETE n } "
+            "IN TRANSACTIONS OF 5000 ROWS",
+            None,
+        ),
+        (
+            "SHOW INDEXES YIELD name WHERE name STARTS WITH $prefix RETURN name",
+            {"prefix": "Scratch_DataClumps_"},
+        ),
+        ("DROP INDEX Scratch_DataClumps_item IF EXISTS", None),
+    ]
@@ -0,0 +1,128 @@
+from itertools import count
+
+import pytest
+
+from cskg.composer.stream_writer import Neo4jComponentWriter
+from cskg.utils.entity import FunctionEntity
+from cskg.utils.relationship import CallsRel
+
+
+class GraphResponder:
+    """Gives created nodes increasing IDs and records created relationships."""
+
+    def __init__(self):
+        self.node_ids = count()
+        self.relationships = []
+
+    def __call__(self, query: str, params: dict):
+        if params and "entities" in params:
+            return [
+                [entity["qname_id"], next(self.node_ids)]
+                for entity in params["entities"]
+            ]
+        if params and "relationships" in params:
+            self.relationships.extend(params["relationships"])
+        return []
+
+
+def get_function(name: str) -> FunctionEntity:
+    return FunctionEntity(
+        name=name,
+        qualified_name=f"pkg.{name}",
+        file_path="pkg.py",
+        subtype="function",
+    )
+
+
+def get_call(from_name: str, to_name: str) -> CallsRel:
+    return CallsRel(
+        from_type=FunctionEntity,
+        from_qualified_name=f"pkg.{from_name}",
+        to_type=FunctionEntity,
+        to_qualified_name=f"pkg.{to_name}",
+        arguments=[],
+    )
+
+
+@pytest.fixture
+def responder() -> GraphResponder:
+    return GraphResponder()
+
+
+@pytest.fixture
+def writer(responder, make_fake_neo_db) -> Neo4jComponentWriter:
+    neo_db = make_fake_neo_db(responder)
+    writer = Neo4jComponentWriter(neo_db, batch_size=2, max_deferred=100)
+    writer.session = neo_db.session()
+    return writer
+
+
+def test_relationships_wait_for_their_entities(writer, responder):
+    writer.buffer(get_function("a"))
+    writer.buffer(get_call("a", "b"))
+    writer.flush_relationships()
+    assert responder.relationships == []
+    assert len(writer.deferred_relationships) == 1
+
+    # Retried with the next batch, well before the stream ends
+    writer.buffer(get_function("b"))
+    writer.flush_relationships()
+    assert len(responder.relationships) == 1
+    assert writer.deferred_relationships == {}
+
+
+def test_only_relationships_of_written_entities_are_retried(writer, responder):
+    writer.buffer(get_function("a"))
+    writer.buffer(get_call("a", "b"))
+    writer.buffer(get_call("a", "c"))
+    writer.flush_relationships()
+
+    writer.buffer(get_function("b"))
+    writer.flush_entities(FunctionEntity.type)
+    assert [r["to_qname_id"] for r in writer.ready_relationships] == [
+        get_function("b").qname_id
+    ]
+    assert writer.deferred_count == 1
+
+
+def test_deferred_relationships_spill_to_disk(writer, responder):
+    writer.max_deferred = 1
+    writer.buffer(get_call("a", "b"))
+    writer.buffer(get_call("b", "c"))
+    writer.buffer(get_call("c", "a"))
+    writer.flush_relationships()
+    assert len(writer.deferred_relationships) == 1
+    assert writer.spilled_count == 2
+
+    for name in ("a", "b", "c"):
+        writer.buffer(get_function(name))
+    writer.flush_all()
+    assert len(responder.relationships) == 3
+    assert writer.dropped_count == 0
+
+
+def test_relationships_without_entities_are_dropped(writer, responder):
+    writer.buffer(get_function("a"))
+    writer.buffer(get_call("a", "missing"))
+    writer.flush_all()
+    assert responder.relationships == []
+    assert writer.dropped_count == 1
+
+
+def test_start_refuses_to_stream_into_a_populated_graph(make_fake_neo_db):
+    writer = Neo4jComponentWriter(make_fake_neo_db(lambda query, params: [[1]]))
+    with pytest.raises(ValueError):
+        writer.start()
+    assert not writer.thread.is_alive()
+
+
+def test_close_reraises_final_flush_error(make_fake_neo_db, close_writer):
+    def responder(query: str, params: dict):
+        raise RuntimeError("write failed")
+
+    writer = Neo4jComponentWriter(make_fake_neo_db(responder))
+    writer.thread.start()
+    writer.write(get_function("a"))
+
+    (error,) = close_writer(writer)
+    assert str(error) == "write failed"
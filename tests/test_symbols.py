@@ -0,0 +1,43 @@
+import pytest
+
+from cskg.utils.entity import FunctionEntity
+from cskg.utils.relationship import CallsRel
+from cskg.utils.symbols import QnameIdChecker, QnameIdCollision, get_qname_id
+
+
+def get_calls_rel(from_qualified_name, to_qualified_name):
+    return CallsRel(
+        from_type=FunctionEntity,
+        from_qualified_name=from_qualified_name,
+        to_type=FunctionEntity,
+        to_qualified_name=to_qualified_name,
+        file_path="pkg.py",
+        lineno=1,
+        arguments=[],
+    )
+
+
+def test_qname_ids_are_stable_and_fit_int64():
+    qname_id = get_qname_id("pkg.mod.func")
+    assert qname_id == get_qname_id("pkg.mod.func")
+    assert qname_id != get_qname_id("pkg.mod.other")
+    assert 0 <= qname_id < 2**63
+
+
+def test_relationships_store_their_endpoints_by_id():
+    calls_rel = get_calls_rel("pkg.caller", "pkg.callee")
+    restored = CallsRel.from_dict(dict(calls_rel))
+
+    assert not {"from_qualified_name", "to_qualified_name", "lineno"} & set(calls_rel)
+    assert restored.from_qname_id == get_qname_id("pkg.caller")
+    assert restored.to_qname_id == get_qname_id("pkg.callee")
+    assert restored.from_qualified_name is None
+
+
+def test_qname_id_collisions_are_raised():
+    qname_id_checker = QnameIdChecker()
+    qname_id_checker.check(1, "pkg.f")
+    qname_id_checker.check(1, "pkg.f")
+
+    with pytest.raises(QnameIdCollision):
+        qname_id_checker.check(1, "pkg.g")
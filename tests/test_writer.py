@@ -0,0 +1,56 @@
+import mongomock
+import pytest
+
+from cskg.interpreter.writer import MongoComponentWriter
+from cskg.utils.entity import FunctionEntity
+
+
+def get_function(name: str) -> FunctionEntity:
+    return FunctionEntity(
+        name=name,
+        qualified_name=f"pkg.{name}",
+        file_path="pkg.py",
+        subtype="function",
+    )
+
+
+def test_writes_entities_once(close_writer):
+    mongo_db = mongomock.MongoClient().db
+    writer = MongoComponentWriter(mongo_db, batch_size=2)
+    writer.start()
+    for name in ("a", "b", "a", "c"):
+        writer.write(get_function(name))
+    assert close_writer(writer) == []
+
+    assert mongo_db.function_ent.count_documents({}) == 3
+    assert writer.duplicate_counts["function_ent"] == 1
+
+
+def test_close_reraises_final_flush_error(close_writer):
+    writer = MongoComponentWriter(mongomock.MongoClient().db)
+
+    def flush_all():
+        raise RuntimeError("flush failed")
+
+    writer.flush_all = flush_all
+    writer.start()
+    writer.write(get_function("a"))
+
+    (error,) = close_writer(writer)
+    assert str(error) == "flush failed"
+
+
+def test_close_reraises_buffer_error(close_writer):
+    writer = MongoComponentWriter(mongomock.MongoClient().db)
+
+    def buffer(component):
+        raise RuntimeError("buffer failed")
+
+    writer.buffer = buffer
+    writer.start()
+    writer.write(get_function("a"))
+
+    (error,) = close_writer(writer)
+    assert str(error) == "buffer failed"
+    with pytest.raises(RuntimeError):
+        writer.write(get_function("b"))